@@ -44,6 +44,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Optional[dict]:
+    """Verify a JWT access token without a database lookup; None if invalid"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload if payload.get("sub") else None
+
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """Validate the bearer token only, for endpoints answered from memory"""
+    payload = decode_access_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
 def authenticate_user(db: Session, username: str, password: str):
     """Authenticate a user by username and password"""
     user = db.query(models.User).filter(models.User.username == username).first()
@@ -0,0 +1,208 @@
+"""
+Teacher and student availability: conflict checks and free slots
+
+Busy time comes from actual lessons (start to end, or the planned duration
+while a lesson is still open) and from weekly schedule slots. Lessons are
+looked up through the (teacher_id/student_id, start_time, end_time) indexes;
+no lesson is assumed to last longer than MAX_LESSON_SPAN, which bounds the
+index range scanned for a window.
+
+Lesson times are naive UTC. Schedule slots and working hours are wall-clock
+times in ACADEMY_TIMEZONE. Results leave as aware datetimes in that zone.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy.orm import Session
+from config import settings
+import crud
+import schedules
+import schemas
+import versions
+
+MAX_LESSON_SPAN = timedelta(hours=24)
+
+# Merged busy intervals per (teacher_id, student_id, week start): {key: (version stamp, intervals)}
+_week_busy: Dict[tuple, tuple] = {}
+_WEEK_CACHE_SIZE = 2048
+
+
+class LessonConflictError(ValueError):
+    """Raised when a lesson would double-book its teacher or student"""
+
+    def __init__(self, conflicts: List["Busy"]):
+        super().__init__("Teacher or student already has a lesson at this time")
+        self.conflicts = conflicts
+
+
+class Busy(NamedTuple):
+    kind: str  # "lesson" or "schedule"
+    id: int  # Lesson or schedule slot id
+    teacher_id: Optional[int]
+    student_id: int
+    start: datetime  # naive UTC
+    end: datetime
+
+
+def _zone() -> ZoneInfo:
+    return ZoneInfo(settings.ACADEMY_TIMEZONE)
+
+
+def as_utc(value: datetime) -> datetime:
+    """Naive UTC, as lesson times are stored; naive input is taken to be UTC already"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def wall_to_utc(value: datetime) -> datetime:
+    """Naive UTC for a naive wall-clock time in ACADEMY_TIMEZONE"""
+    return value.replace(tzinfo=_zone()).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(value: datetime) -> datetime:
+    """Aware ACADEMY_TIMEZONE datetime for a naive UTC one"""
+    return value.replace(tzinfo=timezone.utc).astimezone(_zone())
+
+
+def lesson_busy(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+) -> List[Busy]:
+    """Lessons of a teacher or student overlapping [start, end)"""
+    busy = []
+    rows = crud.get_lessons_in_window(db, start - MAX_LESSON_SPAN, start, end, teacher_id, student_id)
+    for row in rows:
+        lesson_start = as_utc(row.start_time)
+        if row.end_time is not None:
+            lesson_end = as_utc(row.end_time)
+        else:
+            lesson_end = lesson_start + timedelta(minutes=row.duration or 0)
+        if lesson_start < end and lesson_end > start:
+            busy.append(Busy("lesson", row.id, row.teacher_id, row.student_id, lesson_start, lesson_end))
+    return busy
+
+
+def schedule_busy(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+) -> List[Busy]:
+    """Scheduled class occurrences of a teacher or student overlapping [start, end)"""
+    # One spare day on each side covers zone offsets and classes past midnight
+    first_day = to_local(start).date() - timedelta(days=1)
+    last_day = to_local(end).date() + timedelta(days=1)
+    weekdays = schedules.weekdays_between(first_day, last_day)
+    slots = {}
+    for owner in ({"teacher_id": teacher_id}, {"student_id": student_id}):
+        if any(owner.values()):
+            slots.update((slot.id, slot) for slot in crud.get_schedule_slots(db, weekdays, **owner))
+
+    busy = []
+    for local_start, slot in schedules.expand(slots.values(), first_day, last_day):
+        slot_start = wall_to_utc(local_start)
+        slot_end = slot_start + timedelta(minutes=slot.duration)
+        if slot_start < end and slot_end > start:
+            busy.append(Busy("schedule", slot.id, slot.teacher_id, slot.student_id, slot_start, slot_end))
+    return busy
+
+
+def find_conflicts(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    include_schedule: bool = False,
+) -> List[Busy]:
+    """
+    Lessons (and optionally scheduled classes) that would overlap a lesson
+    for this teacher/student in [start, end). The pair's own scheduled class
+    is not a conflict: the lesson is that class taking place.
+    """
+    start, end = as_utc(start), as_utc(end)
+    conflicts = lesson_busy(db, start, end, teacher_id, student_id)
+    if include_schedule:
+        conflicts += [
+            busy for busy in schedule_busy(db, start, end, teacher_id, student_id)
+            if not (busy.teacher_id == teacher_id and busy.student_id == student_id)
+        ]
+    return sorted(conflicts, key=lambda busy: busy.start)
+
+
+def conflict_rows(conflicts: List[Busy]) -> List[dict]:
+    """JSON-ready conflicts in the academy timezone, e.g. for a 409 response body"""
+    return [
+        schemas.LessonConflict(
+            **{**busy._asdict(), "start": to_local(busy.start), "end": to_local(busy.end)}
+        ).model_dump(mode="json")
+        for busy in conflicts
+    ]
+
+
+def _merge(intervals: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def week_busy(db: Session, week_start: date, teacher_id: int, student_id: Optional[int] = None):
+    """
+    Merged busy intervals (naive UTC) of a teacher, and optionally a student,
+    for the week from week_start. Kept in memory until lessons or schedule slots change.
+    """
+    key = (teacher_id, student_id, week_start)
+    stamp = versions.current("lessons", "schedule_slots")
+    memo = _week_busy.get(key)
+    if memo and memo[0] == stamp:
+        return memo[1]
+
+    start = wall_to_utc(datetime.combine(week_start, time.min))
+    end = wall_to_utc(datetime.combine(week_start + timedelta(days=7), time.min))
+    busy = lesson_busy(db, start, end, teacher_id, student_id) + schedule_busy(db, start, end, teacher_id, student_id)
+    merged = _merge([(item.start, item.end) for item in busy])
+    if len(_week_busy) >= _WEEK_CACHE_SIZE:
+        _week_busy.clear()
+    _week_busy[key] = (stamp, merged)
+    return merged
+
+
+def free_slots(
+    db: Session,
+    teacher_id: int,
+    week_start: date,
+    duration: int,
+    day_start: time,
+    day_end: time,
+    student_id: Optional[int] = None,
+) -> List[Tuple[datetime, datetime]]:
+    """Openings of at least duration minutes within each day's working hours of a week"""
+    busy = week_busy(db, week_start, teacher_id, student_id)
+    busy_ends = [end for _, end in busy]
+    needed = timedelta(minutes=duration)
+    openings = []
+    for offset in range(7):
+        day = week_start + timedelta(days=offset)
+        window_start = wall_to_utc(datetime.combine(day, day_start))
+        window_end = wall_to_utc(datetime.combine(day, day_end))
+        cursor = window_start
+        for start, end in busy[bisect_right(busy_ends, window_start):]:
+            if start >= window_end:
+                break
+            if start - cursor >= needed:
+                openings.append((cursor, start))
+            cursor = max(cursor, end)
+        if window_end - cursor >= needed:
+            openings.append((cursor, window_end))
+    return [(to_local(start), to_local(end)) for start, end in openings]
@@ -0,0 +1,169 @@
+"""
+Pub/sub backplane for routing signaling traffic between server processes
+
+Each signaling process publishes presence changes and relays for peers it
+does not hold, and receives the same from every other process. Two
+implementations are provided:
+
+- InProcessBackplane: an in-memory hub shared by every backplane created in
+  the same process (single worker, or several managers in tests)
+- RedisBackplane: speaks the Redis PUBLISH/SUBSCRIBE protocol over a plain
+  TCP socket, so any Redis-compatible broker can link workers and replicas
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import logging
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+
+
+class Backplane(ABC):
+    """Interface: deliver published messages to every other subscriber of a channel"""
+
+    @abstractmethod
+    async def start(self, channel: str, handler: Handler):
+        """Subscribe handler to channel"""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        """Publish a JSON-serialisable message"""
+
+    async def stop(self):
+        """Unsubscribe and release connections"""
+
+
+class InProcessBackplane(Backplane):
+    """In-memory backplane; backplanes in the same process see each other's messages"""
+
+    _subscribers: Dict[str, List["InProcessBackplane"]] = {}
+
+    def __init__(self):
+        self._channel: Optional[str] = None
+        self._handler: Optional[Handler] = None
+
+    async def start(self, channel: str, handler: Handler):
+        self._channel = channel
+        self._handler = handler
+        self._subscribers.setdefault(channel, []).append(self)
+
+    async def publish(self, channel: str, message: dict):
+        loop = asyncio.get_running_loop()
+        for subscriber in self._subscribers.get(channel, ()):
+            if subscriber is not self:
+                # Round-trip through JSON so subscribers never share objects
+                loop.call_soon(subscriber._handler, json.loads(json.dumps(message)))
+
+    async def stop(self):
+        subscribers = self._subscribers.get(self._channel, [])
+        if self in subscribers:
+            subscribers.remove(self)
+
+
+def _encode_command(*parts: str) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    out = [f"*{len(parts)}\r\n".encode()]
+    for part in parts:
+        data = part.encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    """Read one RESP reply"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("backplane connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RuntimeError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        return [await _read_reply(reader) for _ in range(int(body))]
+    raise RuntimeError(f"Unexpected reply: {line!r}")
+
+
+class RedisBackplane(Backplane):
+    """Backplane over the Redis pub/sub protocol (redis://host:port)"""
+
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self._publisher: Optional[tuple] = None
+        self._publish_lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, channel: str, handler: Handler):
+        self._listener = asyncio.create_task(self._listen(channel, handler))
+
+    async def _listen(self, channel: str, handler: Handler):
+        """Hold a SUBSCRIBE connection open, reconnecting if it drops"""
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(_encode_command("SUBSCRIBE", channel))
+                await writer.drain()
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        try:
+                            handler(json.loads(reply[2]))
+                        except Exception as e:
+                            logger.error(f"Backplane handler error: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Backplane subscription lost ({e}); reconnecting")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    async def publish(self, channel: str, message: dict):
+        payload = json.dumps(message, separators=(",", ":"))
+        async with self._publish_lock:
+            try:
+                if self._publisher is None:
+                    self._publisher = await asyncio.open_connection(self.host, self.port)
+                reader, writer = self._publisher
+                writer.write(_encode_command("PUBLISH", channel, payload))
+                await writer.drain()
+                await _read_reply(reader)
+            except Exception as e:
+                logger.error(f"Backplane publish failed: {e}")
+                if self._publisher is not None:
+                    self._publisher[1].close()
+                self._publisher = None
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+
+def create_backplane(url: Optional[str]) -> Backplane:
+    """Build a backplane from a URL: empty/memory:// for in-process, redis://host:port"""
+    if not url or url.startswith("memory://"):
+        return InProcessBackplane()
+    if url.startswith("redis://"):
+        return RedisBackplane(url)
+    raise ValueError(f"Unsupported signaling backplane URL: {url}")
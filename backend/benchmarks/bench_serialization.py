@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: list endpoint serialization cost per 1k rows
+
+Compares the previous path (Pydantic response_model validation +
+jsonable_encoder + stdlib JSON) against the fast path used by
+responses.rows_response (row dicts rendered directly with orjson).
+
+Usage (from the backend directory):
+    python benchmarks/bench_serialization.py
+"""
+import os
+import sys
+import timeit
+from collections import namedtuple
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+import schemas
+from responses import FastJSONResponse
+
+ROWS = 1000
+REPEAT = 20
+
+LessonRow = namedtuple(
+    "LessonRow",
+    "id student_id teacher_id date start_time end_time duration notes created_at "
+    "student_name teacher_name",
+)
+
+
+def make_rows():
+    now = datetime(2024, 1, 15, 15, 0)
+    return [
+        LessonRow(i, i % 50, i % 5, now, now, None, 30, "Lesson notes", now, "Student", "Teacher")
+        for i in range(ROWS)
+    ]
+
+
+def pydantic_path(rows, adapter):
+    """Validate through the response model, then encode (previous behaviour)"""
+    items = adapter.validate_python([row._asdict() for row in rows])
+    return JSONResponse(jsonable_encoder(items)).body
+
+
+def fast_path(rows):
+    """Render column tuples directly (rows_response without DEBUG)"""
+    return FastJSONResponse([row._asdict() for row in rows]).body
+
+
+def main():
+    rows = make_rows()
+    adapter = TypeAdapter(List[schemas.LessonWithDetails])
+
+    for label, fn in (
+        ("pydantic + jsonable_encoder", lambda: pydantic_path(rows, adapter)),
+        ("fast path (orjson)", lambda: fast_path(rows)),
+    ):
+        best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+        print(f"{label:30s} {best * 1000:8.2f} ms per {ROWS} rows")
+
+
+if __name__ == "__main__":
+    main()
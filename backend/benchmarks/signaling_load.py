@@ -0,0 +1,287 @@
+"""
+Load simulator for the WebRTC signaling servers
+
+Simulates teacher/student pairs: each pair joins a lesson room, exchanges an
+offer and an answer, then bursts ICE candidates in both directions. Reports
+relay latency percentiles and, when the server process is known, memory per
+connection and CPU time per relayed frame and candidate (Linux /proc only).
+
+Usage (from the backend directory):
+    # Start and measure the Python server (uvicorn main:app)
+    python benchmarks/signaling_load.py --target python --clients 2000
+
+    # Start and measure the Node server in "video call/signaling-server.js"
+    python benchmarks/signaling_load.py --target node --clients 2000
+
+    # Drive an already running server (no memory/CPU figures unless --pid is given)
+    python benchmarks/signaling_load.py --url ws://localhost:8000/ws/signaling --pid 1234
+
+    # Negotiate candidate batching or binary frames (Python server only)
+    python benchmarks/signaling_load.py --protocol binary
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from signaling_frames import decode_body, encode_frame, split_frame
+
+NODE_SERVER = os.path.join(os.path.dirname(BACKEND_DIR), "video call", "signaling-server.js")
+
+# Roughly the size of a browser SDP offer/answer and an ICE candidate line
+FAKE_SDP = "v=0\r\n" + "a=fake-sdp-attribute:0123456789abcdef\r\n" * 80
+FAKE_CANDIDATE = "candidate:842163049 1 udp 1677729535 203.0.113.7 54321 typ srflx raddr 10.0.0.2 rport 54321"
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.frames = 0
+        self.candidates = 0
+        # Batches carry no per-message timestamp; keyed (sender, target)
+        self.burst_started: Dict[tuple, float] = {}
+
+    def record(self, message: dict):
+        sent_at = message.get("sentAt")
+        if sent_at is not None:
+            self.latencies.append(time.perf_counter() - sent_at)
+
+
+class SimulatedClient:
+    """One browser peer: registers, answers pings and records relay latency"""
+
+    def __init__(self, client_id: str, room: int, url: str, stats: Stats, protocol: str):
+        self.client_id = client_id
+        self.room = room
+        self.url = url
+        self.stats = stats
+        self.protocol = protocol
+        self.ws = None
+        self.events: Dict[str, asyncio.Event] = {}
+        self.received: Dict[str, int] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    def event(self, name: str) -> asyncio.Event:
+        return self.events.setdefault(name, asyncio.Event())
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_size=None, ping_interval=None)
+        self._reader = asyncio.create_task(self._read())
+        register = {"type": "register", "clientId": self.client_id, "room": self.room}
+        if self.protocol != "json":
+            register["features"] = [self.protocol]
+        await self.send(register)
+
+    async def send(self, message: dict):
+        await self.ws.send(json.dumps(message))
+
+    async def relay(self, message_type: str, target: str, **payload):
+        await self.send({"type": message_type, "target": target, "sentAt": time.perf_counter(), **payload})
+
+    async def send_candidates(self, target: str, candidates: List[dict]):
+        """Send a burst of candidates the way the negotiated protocol allows"""
+        self.stats.burst_started[(self.client_id, target)] = time.perf_counter()
+        if self.protocol == "binary":
+            await self.ws.send(encode_frame(target, [candidates]))
+        elif self.protocol == "batch":
+            await self.send({"type": "ice-candidates", "target": target, "candidates": candidates})
+        else:
+            for candidate in candidates:
+                await self.relay("ice-candidate", target, candidate=candidate)
+
+    def _received_candidates(self, sender: str, count: int):
+        started = self.stats.burst_started.get((sender, self.client_id))
+        if started is not None:
+            self.stats.latencies.append(time.perf_counter() - started)
+        self.stats.frames += 1
+        self.stats.candidates += count
+        self.received["ice-candidate"] = self.received.get("ice-candidate", 0) + count
+        self.event("ice-candidate").set()
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                if isinstance(raw, bytes):
+                    _, sender, body = split_frame(raw)
+                    self._received_candidates(sender, len(decode_body(body)))
+                    continue
+                message = json.loads(raw)
+                message_type = message.get("type")
+                if message_type == "ice-candidates":
+                    self._received_candidates(message["from"], len(message["candidates"]))
+                    continue
+                if message_type == "ping":
+                    await self.send({"type": "pong"})
+                    continue
+                if message_type in ("offer", "answer", "ice-candidate"):
+                    self.stats.record(message)
+                    self.stats.frames += 1
+                    self.stats.candidates += message_type == "ice-candidate"
+                self.received[message_type] = self.received.get(message_type, 0) + 1
+                self.event(message_type).set()
+        except websockets.ConnectionClosed:
+            pass
+
+    async def wait_for(self, message_type: str, count: int = 1, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while self.received.get(message_type, 0) < count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"{self.client_id} waiting for {message_type}")
+            self.event(message_type).clear()
+            await asyncio.wait_for(self.event(message_type).wait(), remaining)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+async def run_pair(index: int, url: str, stats: Stats, candidates: int, gate: asyncio.Semaphore, protocol: str):
+    """A teacher/student pair performing a full call setup"""
+    teacher = SimulatedClient(f"teacher_{index}", index, url, stats, protocol)
+    student = SimulatedClient(f"student_{index}", index, url, stats, protocol)
+    try:
+        async with gate:
+            await teacher.connect()
+            await teacher.wait_for("clients")
+            await student.connect()
+            await student.wait_for("clients")
+            await teacher.wait_for("user-joined")
+
+        await teacher.relay("offer", student.client_id, offer={"type": "offer", "sdp": FAKE_SDP})
+        await student.wait_for("offer")
+        await student.relay("answer", teacher.client_id, answer={"type": "answer", "sdp": FAKE_SDP})
+        await teacher.wait_for("answer")
+
+        burst = [
+            {"candidate": FAKE_CANDIDATE, "sdpMid": "0", "sdpMLineIndex": n % 2}
+            for n in range(candidates)
+        ]
+        for peer, other in ((teacher, student), (student, teacher)):
+            await peer.send_candidates(other.client_id, burst)
+        await teacher.wait_for("ice-candidate", candidates)
+        await student.wait_for("ice-candidate", candidates)
+    except Exception:
+        stats.errors += 1
+    return teacher, student
+
+
+def read_process(pid: int):
+    """(RSS bytes, CPU seconds) of a process from /proc, or None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            rss = next(int(line.split()[1]) * 1024 for line in status_file if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/stat") as stat_file:
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        return rss, (int(fields[11]) + int(fields[12])) / ticks
+    except (OSError, StopIteration, ValueError):
+        return None
+
+
+def start_server(target: str, port: int):
+    """Launch the server under test and return (process, url)"""
+    if target == "python":
+        database = os.path.join(tempfile.gettempdir(), "signaling_bench.db")
+        env = {"DATABASE_URL": f"sqlite:///{database}", "SECRET_KEY": "benchmark", **os.environ}
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        return process, f"ws://127.0.0.1:{port}/ws/signaling"
+    process = subprocess.Popen(["node", NODE_SERVER], stdout=subprocess.DEVNULL, env={**os.environ, "PORT": str(port)})
+    return process, f"ws://127.0.0.1:{port}"
+
+
+async def wait_until_up(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            ws = await websockets.connect(url)
+            await ws.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["python", "node"], default="python")
+    parser.add_argument("--url", help="Signaling URL of an already running server")
+    parser.add_argument("--pid", type=int, help="PID of the server behind --url, for memory/CPU figures")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the server when started here")
+    parser.add_argument("--clients", type=int, default=1000, help="Total simulated peers (two per room)")
+    parser.add_argument("--candidates", type=int, default=20, help="ICE candidates sent by each peer")
+    parser.add_argument("--concurrency", type=int, default=200, help="Pairs connecting at the same time")
+    parser.add_argument("--protocol", choices=["json", "batch", "binary"], default="json",
+                        help="Candidate protocol negotiated at register (batch/binary need the Python server)")
+    args = parser.parse_args()
+    if args.protocol != "json" and args.target == "node" and not args.url:
+        parser.error("--protocol batch/binary is only supported by the Python server")
+
+    process = None
+    url, pid = args.url, args.pid
+    if not url:
+        process, url = start_server(args.target, args.port)
+        pid = process.pid
+    try:
+        await wait_until_up(url)
+        baseline = read_process(pid) if pid else None
+
+        stats = Stats()
+        gate = asyncio.Semaphore(args.concurrency)
+        pairs = args.clients // 2
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_pair(i, url, stats, args.candidates, gate, args.protocol) for i in range(pairs)
+        ))
+        elapsed = time.perf_counter() - started
+        loaded = read_process(pid) if pid else None
+
+        print(f"target:            {args.url or args.target} ({args.protocol})")
+        print(f"clients:           {pairs * 2} ({pairs} rooms, {stats.errors} failed pairs)")
+        print(f"relayed frames:    {stats.frames} in {elapsed:.2f}s ({stats.frames / elapsed:.0f}/s)")
+        print(f"frames per call:   {stats.frames / max(pairs, 1):8.1f} ({stats.candidates} candidates)")
+        for pct in (50, 90, 99):
+            print(f"relay latency p{pct}: {percentile(stats.latencies, pct) * 1000:8.2f} ms")
+        if stats.latencies:
+            print(f"relay latency max: {max(stats.latencies) * 1000:8.2f} ms"
+                  f" (mean {statistics.mean(stats.latencies) * 1000:.2f} ms)")
+        if baseline and loaded:
+            print(f"memory/connection: {(loaded[0] - baseline[0]) / max(pairs * 2, 1) / 1024:8.1f} KiB")
+            cpu = loaded[1] - baseline[1]
+            print(f"CPU/frame:         {cpu / max(stats.frames, 1) * 1e6:8.1f} us")
+            print(f"CPU/candidate:     {cpu / max(stats.candidates, 1) * 1e6:8.1f} us")
+
+        await asyncio.gather(*(client.close() for pair in results for client in pair))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+"""
+Create a month's payments for every active student
+
+Usage:
+    python billing_run.py 2024-01 [--notes "January tuition"]
+
+Safe to re-run: students already billed for the month are skipped.
+"""
+import argparse
+import re
+from database import SessionLocal, Base, engine
+import crud
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk monthly billing run")
+    parser.add_argument("month", help='Billing month, format "2024-01"')
+    parser.add_argument("--notes", help="Notes stored on each created payment")
+    args = parser.parse_args()
+    if not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", args.month):
+        parser.error('month must look like "2024-01"')
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        created = crud.run_billing(db, args.month, args.notes)
+        total = crud.count_payments(db, month=args.month)
+        print(f"Billing run {args.month}: created {created} payments ({total} for the month)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,29 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    DEBUG: bool = False  # Validate fast-path list responses against their schemas
+
+    # WebRTC signaling server
+    SIGNALING_SEND_QUEUE_SIZE: int = 256  # Outbound messages buffered per connection
+    SIGNALING_SEND_TIMEOUT: float = 5.0  # Seconds a single send may block
+    SIGNALING_HEARTBEAT_INTERVAL: float = 15.0  # Seconds between server pings
+    SIGNALING_HEARTBEAT_TIMEOUT: float = 45.0  # Silence after which a client is reaped
+    SIGNALING_CANDIDATE_BATCH_WINDOW: float = 0.02  # Seconds ICE candidates are coalesced
+    SIGNALING_BACKPLANE_URL: Optional[str] = None  # redis://host:port to link workers
+
+    # Lesson start/end from video room events
+    LESSON_AUTO_TRACKING: bool = True
+    LESSON_END_GRACE: float = 60.0  # Seconds a room may stay empty before its lesson ends
+    LESSON_WRITE_INTERVAL: float = 2.0  # Seconds tracker writes are batched
+
+    # Stale open-lesson sweeper
+    LESSON_SWEEP_INTERVAL: float = 600.0  # Seconds between sweeps (0 disables)
+    LESSON_MAX_OPEN_HOURS: float = 6.0  # Open lessons older than this are closed
+    LESSON_AUTO_CLOSE_MINUTES: int = 60  # Longest duration recorded for auto-closed lessons
+    LESSON_SWEEP_BATCH: int = 500  # Lessons closed per transaction
+
+    # Wall-clock zone of student schedules and working hours (lesson times are stored in UTC)
+    ACADEMY_TIMEZONE: str = "UTC"
 
     class Config:
         env_file = ".env"
@@ -1,13 +1,40 @@
 """
 CRUD (Create, Read, Update, Delete) operations for database models
 """
+import secrets
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
-from datetime import datetime, date, timedelta
-from typing import List, Optional
+from sqlalchemy import func, and_, or_, case, extract, exists, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, time, timedelta, timezone
+from typing import Dict, List, Optional
 import models
 import schemas
 from auth import get_password_hash
+from pagination import after_keyset
+import versions
+import report_cache
+import schedules
+import names
+import availability  # Imports crud too; only used inside functions here
+
+
+def _lesson_periods(value: datetime):
+    return (value.strftime("%Y-%m"), value.strftime("%Y-%m-%d"))
+
+
+# Payments are versioned per billing month and lessons per month and day,
+# so reports over closed periods can be reused until a back-dated write
+versions.track_period(models.Payment, "month")
+versions.track_period(models.Lesson, "date", _lesson_periods)
+# Lessons and schedule slots are also versioned per teacher and student (calendar feeds)
+for _model in (models.Lesson, models.ScheduleSlot):
+    versions.track_period(_model, "teacher_id", lambda value: (f"teacher:{value}",))
+    versions.track_period(_model, "student_id", lambda value: (f"student:{value}",))
+# and per lesson (the lesson tracker's cached teacher/student of a lesson)
+versions.track_period(models.Lesson, "id", lambda value: (f"lesson:{value}",))
+report_cache.register("teacher_hours", "lessons")
+report_cache.register("revenue", "payments")
 
 
 # ============= User CRUD =============
@@ -22,11 +49,63 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
         teacher_id=user.teacher_id,
     )
     db.add(db_user)
+    names.changed(db)
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
+def _add_account(
+    db: Session, username: str, email: str, password: str, role: models.UserRole
+) -> models.User:
+    """Add a user account to the current transaction without committing.
+
+    The flush assigns the primary key so a profile can be linked to it;
+    the caller commits the account and profile together.
+    """
+    db_user = models.User(
+        username=username,
+        email=email,
+        hashed_password=get_password_hash(password),
+        role=role,
+    )
+    db.add(db_user)
+    db.flush()
+    names.changed(db)
+    return db_user
+
+
+def signup(db: Session, request: schemas.SignupRequest) -> models.User:
+    """Create a user account and its teacher/student profile in a single transaction"""
+    db_user = _add_account(
+        db,
+        username=request.username,
+        email=request.email,
+        password=request.password,
+        role=request.role,
+    )
+
+    if request.role == models.UserRole.TEACHER:
+        db.add(models.Teacher(
+            name=request.name,
+            subject=request.subject,
+            phone=request.phone,
+            email=request.email,
+            user_id=db_user.id,
+        ))
+    elif request.role == models.UserRole.STUDENT:
+        db.add(models.Student(
+            name=request.name,
+            parent_contact=request.parent_contact,
+            teams_id=request.teams_id,
+            fee_status=models.FeeStatus.UNPAID,
+            user_id=db_user.id,
+        ))
+
+    db.commit()
+    return db_user
+
+
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     """Get user by username"""
     return db.query(models.User).filter(models.User.username == username).first()
@@ -37,54 +116,88 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
-# ============= Teacher CRUD =============
-def create_teacher(db: Session, teacher: schemas.TeacherCreate) -> models.Teacher:
-    """Create a new teacher and associated user account"""
-    # Extract username and password from request
-    username = teacher.username
-    password = teacher.password
+def get_user_by_calendar_token(db: Session, token: str) -> Optional[models.User]:
+    """Get user by calendar feed token"""
+    return db.query(models.User).filter(models.User.calendar_token == token).first()
 
-    # Check if username already exists
-    existing_user = get_user_by_username(db, username)
-    if existing_user:
-        raise ValueError(f"Username '{username}' is already taken")
 
-    # Create teacher profile (exclude username and password from teacher model)
-    teacher_data = teacher.dict(exclude={'username', 'password'})
-    db_teacher = models.Teacher(**teacher_data)
-    db.add(db_teacher)
+def rotate_calendar_token(db: Session, user: models.User) -> str:
+    """Give a user a new calendar feed token; links with the old one stop working"""
+    user.calendar_token = secrets.token_urlsafe(24)
     db.commit()
-    db.refresh(db_teacher)
+    return user.calendar_token
+
+
+def get_calendar_owner(db: Session, user: models.User):
+    """("teacher" or "student", profile id, name) of a user's calendar, or None without a profile"""
+    if user.role == models.UserRole.TEACHER:
+        profile = db.query(models.Teacher.id, models.Teacher.name).filter(models.Teacher.user_id == user.id).first()
+        return ("teacher", *profile) if profile else None
+    if user.role == models.UserRole.STUDENT:
+        profile = db.query(models.Student.id, models.Student.name).filter(models.Student.user_id == user.id).first()
+        return ("student", *profile) if profile else None
+    return None
+
+
+def get_counterpart_user_ids(db: Session, user_id: int, role: str) -> set:
+    """User ids of a teacher's assigned students, or of a student's assigned teacher"""
+    if role == models.UserRole.TEACHER.value:
+        rows = db.query(models.Student.user_id).join(
+            models.Teacher, models.Student.assigned_teacher_id == models.Teacher.id
+        ).filter(models.Teacher.user_id == user_id)
+    elif role == models.UserRole.STUDENT.value:
+        rows = db.query(models.Teacher.user_id).join(
+            models.Student, models.Student.assigned_teacher_id == models.Teacher.id
+        ).filter(models.Student.user_id == user_id)
+    else:
+        return set()
+    return {row.user_id for row in rows if row.user_id is not None}
 
-    # Create user account for teacher
-    email = db_teacher.email if db_teacher.email else f"{username}@academy.com"
-    hashed_password = get_password_hash(password)
-    db_user = models.User(
-        username=username,
-        email=email,
-        hashed_password=hashed_password,
+
+# ============= Teacher CRUD =============
+def create_teacher(db: Session, teacher: schemas.TeacherCreate) -> models.Teacher:
+    """Create a new teacher and associated user account in a single transaction"""
+    # Check if username already exists
+    if get_user_by_username(db, teacher.username):
+        raise ValueError(f"Username '{teacher.username}' is already taken")
+
+    db_user = _add_account(
+        db,
+        username=teacher.username,
+        email=teacher.email or f"{teacher.username}@academy.com",
+        password=teacher.password,
         role=models.UserRole.TEACHER,
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
 
-    # Link teacher to user
-    db_teacher.user_id = db_user.id
+    # Create teacher profile (exclude username and password from teacher model)
+    teacher_data = teacher.dict(exclude={'username', 'password'})
+    db_teacher = models.Teacher(**teacher_data, user_id=db_user.id)
+    db.add(db_teacher)
     db.commit()
-    db.refresh(db_teacher)
-
     return db_teacher
 
 
 def get_teachers(
-    db: Session, skip: int = 0, limit: int = 100, status: Optional[str] = None
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[str] = None,
+    after: Optional[tuple] = None,
 ) -> List[models.Teacher]:
-    """Get list of teachers with optional filtering"""
+    """Get list of teachers with optional filtering, ordered by id"""
     query = db.query(models.Teacher)
     if status:
         query = query.filter(models.Teacher.status == status)
-    return query.offset(skip).limit(limit).all()
+    query = after_keyset(query, None, models.Teacher.id, after)
+    return query.order_by(models.Teacher.id).offset(skip).limit(limit).all()
+
+
+def count_teachers(db: Session, status: Optional[str] = None) -> int:
+    """Count teachers with optional filtering"""
+    query = db.query(models.Teacher)
+    if status:
+        query = query.filter(models.Teacher.status == status)
+    return query.count()
 
 
 def get_teacher(db: Session, teacher_id: int) -> Optional[models.Teacher]:
@@ -101,6 +214,8 @@ def update_teacher(
         update_data = teacher.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_teacher, key, value)
+        if "name" in update_data:
+            names.changed(db)
         db.commit()
         db.refresh(db_teacher)
     return db_teacher
@@ -110,7 +225,11 @@ def delete_teacher(db: Session, teacher_id: int) -> bool:
     """Delete a teacher"""
     db_teacher = get_teacher(db, teacher_id)
     if db_teacher:
+        # Students are unassigned through Teacher.students; their schedule slots follow
+        for slot in db.query(models.ScheduleSlot).filter(models.ScheduleSlot.teacher_id == teacher_id):
+            slot.teacher_id = None
         db.delete(db_teacher)
+        names.changed(db)
         db.commit()
         return True
     return False
@@ -133,59 +252,79 @@ def get_teacher_daily_hours(db: Session, teacher_id: int, target_date: date) ->
 
 
 def get_teacher_monthly_hours(db: Session, teacher_id: int, year: int, month: int) -> float:
-    """Get total hours taught by a teacher in a specific month"""
-    lessons = (
-        db.query(models.Lesson)
-        .filter(
-            and_(
-                models.Lesson.teacher_id == teacher_id,
-                extract("year", models.Lesson.date) == year,
-                extract("month", models.Lesson.date) == month,
+    """Get total hours taught by a teacher in a specific month (cached once the month has ended)"""
+    period = f"{year}-{month:02d}"
+
+    def compute(periods):
+        total_minutes = (
+            db.query(func.coalesce(func.sum(models.Lesson.duration), 0))
+            .filter(
+                and_(
+                    models.Lesson.teacher_id == teacher_id,
+                    extract("year", models.Lesson.date) == year,
+                    extract("month", models.Lesson.date) == month,
+                )
             )
+            .scalar()
         )
-        .all()
+        return {period: total_minutes / 60.0}
+
+    return report_cache.cached(db, "teacher_hours", teacher_id, [period], compute)[period]
+
+
+def get_teacher_payroll(db: Session, month: str):
+    """
+    Query hours, lesson count and distinct students per teacher for a
+    "YYYY-MM" month in one grouped query. Teachers without lessons that
+    month are included with zeros.
+    """
+    year, month_number = map(int, month.split("-"))
+    start = datetime(year, month_number, 1)
+    end = datetime(year + month_number // 12, month_number % 12 + 1, 1)
+    lessons_in_month = and_(
+        models.Lesson.teacher_id == models.Teacher.id,
+        models.Lesson.date >= start,
+        models.Lesson.date < end,
+    )
+    return (
+        db.query(
+            models.Teacher.id.label("teacher_id"),
+            models.Teacher.name.label("teacher_name"),
+            models.Teacher.status,
+            literal(month).label("month"),
+            (func.coalesce(func.sum(models.Lesson.duration), 0) / 60.0).label("hours"),
+            func.count(models.Lesson.id).label("lesson_count"),
+            func.count(models.Lesson.student_id.distinct()).label("student_count"),
+        )
+        .outerjoin(models.Lesson, lessons_in_month)
+        .group_by(models.Teacher.id, models.Teacher.name, models.Teacher.status)
+        .order_by(models.Teacher.name, models.Teacher.id)
     )
-    total_minutes = sum(lesson.duration for lesson in lessons)
-    return total_minutes / 60.0
 
 
 # ============= Student CRUD =============
 def create_student(db: Session, student: schemas.StudentCreate) -> models.Student:
-    """Create a new student and associated user account"""
-    # Extract username and password from request
-    username = student.username
-    password = student.password
-
+    """Create a new student and associated user account in a single transaction"""
     # Check if username already exists
-    existing_user = get_user_by_username(db, username)
-    if existing_user:
-        raise ValueError(f"Username '{username}' is already taken")
+    if get_user_by_username(db, student.username):
+        raise ValueError(f"Username '{student.username}' is already taken")
+
+    db_user = _add_account(
+        db,
+        username=student.username,
+        email=f"{student.username}@academy.com",
+        password=student.password,
+        role=models.UserRole.STUDENT,
+    )
 
     # Create student profile (exclude username and password from student model)
     student_data = student.dict(exclude={'username', 'password'})
-    db_student = models.Student(**student_data)
+    db_student = models.Student(**student_data, user_id=db_user.id)
+    sync_schedule_slots(db_student)
     db.add(db_student)
+    if db_student.assigned_teacher_id:
+        _update_stat_counters(db, models.Teacher, db_student.assigned_teacher_id, active_students=1)
     db.commit()
-    db.refresh(db_student)
-
-    # Create user account for student
-    email = f"{username}@academy.com"
-    hashed_password = get_password_hash(password)
-    db_user = models.User(
-        username=username,
-        email=email,
-        hashed_password=hashed_password,
-        role=models.UserRole.STUDENT,
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    # Link student to user
-    db_student.user_id = db_user.id
-    db.commit()
-    db.refresh(db_student)
-
     return db_student
 
 
@@ -193,6 +332,7 @@ def get_students(
     db: Session,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[tuple] = None,
     teacher_id: Optional[int] = None,
     fee_status: Optional[str] = None,
 ) -> List[models.Student]:
@@ -202,7 +342,39 @@ def get_students(
         query = query.filter(models.Student.assigned_teacher_id == teacher_id)
     if fee_status:
         query = query.filter(models.Student.fee_status == fee_status)
-    return query.offset(skip).limit(limit).all()
+    query = after_keyset(query, None, models.Student.id, after)
+    return query.order_by(models.Student.id).offset(skip).limit(limit).all()
+
+
+def get_student_rows(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    teacher_id: Optional[int] = None,
+    fee_status: Optional[str] = None,
+):
+    """Get student list rows (with teacher name) as column tuples"""
+    query = db.query(
+        models.Student.id,
+        models.Student.name,
+        models.Student.parent_contact,
+        models.Student.teams_id,
+        models.Student.assigned_teacher_id,
+        models.Student.schedule,
+        models.Student.fee_amount,
+        models.Student.fee_status,
+        models.Student.notes,
+        models.Student.created_at,
+        models.Student.updated_at,
+        models.Teacher.name.label("teacher_name"),
+    ).outerjoin(models.Teacher, models.Student.assigned_teacher_id == models.Teacher.id)
+    if teacher_id:
+        query = query.filter(models.Student.assigned_teacher_id == teacher_id)
+    if fee_status:
+        query = query.filter(models.Student.fee_status == fee_status)
+    query = after_keyset(query, None, models.Student.id, after)
+    return query.order_by(models.Student.id).offset(skip).limit(limit).all()
 
 
 def get_student(db: Session, student_id: int) -> Optional[models.Student]:
@@ -213,22 +385,69 @@ def get_student(db: Session, student_id: int) -> Optional[models.Student]:
 def update_student(
     db: Session, student_id: int, student: schemas.StudentUpdate
 ) -> Optional[models.Student]:
-    """Update a student"""
+    """
+    Update a student. A changed schedule text that cannot be parsed raises
+    schedules.ScheduleError (a ValueError); unchanged text is accepted as stored.
+    """
     db_student = get_student(db, student_id)
     if db_student:
         update_data = student.dict(exclude_unset=True)
+        new_schedule = update_data.get("schedule")
+        if new_schedule and new_schedule != db_student.schedule:
+            schedules.parse_schedule(new_schedule)
+        old_teacher_id = db_student.assigned_teacher_id
         for key, value in update_data.items():
             setattr(db_student, key, value)
+        if db_student.assigned_teacher_id != old_teacher_id:
+            if old_teacher_id:
+                _update_stat_counters(db, models.Teacher, old_teacher_id, active_students=-1)
+            if db_student.assigned_teacher_id:
+                _update_stat_counters(db, models.Teacher, db_student.assigned_teacher_id, active_students=1)
+        if "schedule" in update_data or "assigned_teacher_id" in update_data:
+            sync_schedule_slots(db_student)
+        if "name" in update_data:
+            names.changed(db)
         db.commit()
         db.refresh(db_student)
     return db_student
 
 
+def sync_schedule_slots(db_student: models.Student) -> bool:
+    """
+    Rebuild a student's schedule slots from its schedule text (not committed).
+    Returns False, leaving existing slots in place, for text that cannot be parsed.
+    """
+    try:
+        parsed = schedules.parse_schedule(db_student.schedule)
+    except schedules.ScheduleError:
+        for slot in db_student.schedule_slots:
+            slot.teacher_id = db_student.assigned_teacher_id
+        return False
+    current = {
+        (slot.weekday, slot.start_time, slot.duration, slot.teacher_id) for slot in db_student.schedule_slots
+    }
+    if current == {(*slot, db_student.assigned_teacher_id) for slot in parsed}:
+        return True
+    db_student.schedule_slots = [
+        models.ScheduleSlot(
+            teacher_id=db_student.assigned_teacher_id,
+            weekday=slot.weekday,
+            start_time=slot.start_time,
+            duration=slot.duration,
+        )
+        for slot in parsed
+    ]
+    return True
+
+
 def delete_student(db: Session, student_id: int) -> bool:
     """Delete a student"""
     db_student = get_student(db, student_id)
     if db_student:
+        if db_student.assigned_teacher_id:
+            _update_stat_counters(db, models.Teacher, db_student.assigned_teacher_id, active_students=-1)
         db.delete(db_student)
+        names.changed(db)
         db.commit()
         return True
     return False
@@ -246,50 +465,304 @@ def count_students(
     return query.count()
 
 
+# ============= Schedule CRUD =============
+def get_schedule_slots(
+    db: Session,
+    weekdays: List[int],
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    from_time: Optional[time] = None,
+    to_time: Optional[time] = None,
+):
+    """
+    Get schedule slot rows (with student/teacher names) on the given weekdays,
+    optionally starting within a time-of-day window, via the weekday/start index
+    """
+    query = db.query(
+        models.ScheduleSlot.id,
+        models.ScheduleSlot.student_id,
+        models.Student.name.label("student_name"),
+        models.ScheduleSlot.teacher_id,
+        models.Teacher.name.label("teacher_name"),
+        models.ScheduleSlot.weekday,
+        models.ScheduleSlot.start_time,
+        models.ScheduleSlot.duration,
+    ).join(models.Student, models.ScheduleSlot.student_id == models.Student.id
+    ).outerjoin(models.Teacher, models.ScheduleSlot.teacher_id == models.Teacher.id)
+    query = query.filter(models.ScheduleSlot.weekday.in_(weekdays))
+    if teacher_id:
+        query = query.filter(models.ScheduleSlot.teacher_id == teacher_id)
+    if student_id:
+        query = query.filter(models.ScheduleSlot.student_id == student_id)
+    if from_time:
+        query = query.filter(models.ScheduleSlot.start_time >= from_time)
+    if to_time:
+        query = query.filter(models.ScheduleSlot.start_time <= to_time)
+    return query.order_by(models.ScheduleSlot.start_time, models.ScheduleSlot.id).all()
+
+
+def get_lessons_in_window(
+    db: Session,
+    started_after: datetime,
+    window_start: datetime,
+    window_end: datetime,
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+):
+    """
+    Get lesson interval rows of a teacher and/or student that may overlap a
+    window: started after started_after and before window_end, and not ended
+    before window_start. Uses the (teacher_id/student_id, start_time, end_time) indexes.
+    """
+    owners = []
+    if teacher_id:
+        owners.append(models.Lesson.teacher_id == teacher_id)
+    if student_id:
+        owners.append(models.Lesson.student_id == student_id)
+    return (
+        db.query(
+            models.Lesson.id,
+            models.Lesson.teacher_id,
+            models.Lesson.student_id,
+            models.Lesson.start_time,
+            models.Lesson.end_time,
+            models.Lesson.duration,
+        )
+        .filter(
+            or_(*owners),
+            models.Lesson.start_time >= started_after,
+            models.Lesson.start_time < window_end,
+            or_(models.Lesson.end_time.is_(None), models.Lesson.end_time > window_start),
+        )
+        .order_by(models.Lesson.start_time)
+        .all()
+    )
+
+
+# ============= Lesson stat counters =============
+def _lesson_stats(db_lesson: models.Lesson) -> tuple:
+    """A lesson's share of the (lesson_count, total_minutes, completed_lessons) counters"""
+    return (1, db_lesson.duration or 0, 1 if db_lesson.end_time else 0)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _update_stat_counters(db: Session, model, owner_id: int, **deltas):
+    """Add to counter columns of one student or teacher row (not committed)"""
+    table = model.__table__
+    values = {name: table.c[name] + delta for name, delta in deltas.items() if name != "last_lesson_at" and delta}
+    last_at = deltas.get("last_lesson_at")
+    if last_at is not None:
+        column = table.c.last_lesson_at
+        values["last_lesson_at"] = case((or_(column.is_(None), column < last_at), last_at), else_=column)
+    if values:
+        # Counters are not an edit of the profile: keep updated_at
+        values["updated_at"] = table.c.updated_at
+        db.execute(update(table).where(table.c.id == owner_id).values(**values))
+
+
+def _count_lessons(db: Session, changes):
+    """
+    Apply the counter changes of lessons written in this transaction.
+    changes: (lesson, its _lesson_stats() before the write, or None if new)
+    """
+    totals = {}
+    for db_lesson, before in changes:
+        after = _lesson_stats(db_lesson)
+        before = before or (0, 0, 0)
+        started = _naive_utc(db_lesson.start_time)
+        for owner in ((models.Student, db_lesson.student_id), (models.Teacher, db_lesson.teacher_id)):
+            total = totals.setdefault(owner, [0, 0, 0, started])
+            for i in range(3):
+                total[i] += after[i] - before[i]
+            total[3] = max(total[3], started)
+    for (model, owner_id), (lessons, minutes, completed, last_at) in totals.items():
+        _update_stat_counters(
+            db, model, owner_id,
+            lesson_count=lessons, total_minutes=minutes, completed_lessons=completed, last_lesson_at=last_at,
+        )
+
+
+def rebuild_stat_counters(db: Session) -> None:
+    """Recompute every student's and teacher's counters from lessons and assignments (not committed)"""
+    lessons = models.Lesson.__table__
+    for model, owner_column in ((models.Student, lessons.c.student_id), (models.Teacher, lessons.c.teacher_id)):
+        table = model.__table__
+        mine = owner_column == table.c.id
+        values = {
+            "lesson_count": select(func.count()).where(mine).scalar_subquery(),
+            "total_minutes": select(func.coalesce(func.sum(lessons.c.duration), 0)).where(mine).scalar_subquery(),
+            "completed_lessons": select(func.count()).where(mine, lessons.c.end_time.isnot(None)).scalar_subquery(),
+            "last_lesson_at": select(func.max(lessons.c.start_time)).where(mine).scalar_subquery(),
+            "updated_at": table.c.updated_at,
+        }
+        if model is models.Teacher:
+            students = models.Student.__table__
+            values["active_students"] = (
+                select(func.count()).where(students.c.assigned_teacher_id == table.c.id).scalar_subquery()
+            )
+        db.execute(update(table).values(**values))
+
+
 # ============= Lesson CRUD =============
+def _lock_parties(db: Session, teacher_id: int, student_id: int):
+    """
+    Lock the teacher and student rows until commit, so bookings for either
+    are checked and inserted one at a time (SELECT ... FOR UPDATE; SQLite has
+    no row locks, so a no-op UPDATE takes its database write lock instead)
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        teachers = models.Teacher.__table__
+        db.execute(update(teachers).where(teachers.c.id == teacher_id).values(id=teachers.c.id))
+        return
+    db.query(models.Teacher.id).filter(models.Teacher.id == teacher_id).with_for_update().all()
+    db.query(models.Student.id).filter(models.Student.id == student_id).with_for_update().all()
+
+
+def _check_free(db: Session, start: datetime, end: datetime, teacher_id: int, student_id: int):
+    """Raise LessonConflictError if the teacher or student has a lesson in [start, end)"""
+    _lock_parties(db, teacher_id, student_id)
+    conflicts = availability.find_conflicts(db, start, end, teacher_id, student_id)
+    if conflicts:
+        db.rollback()
+        raise availability.LessonConflictError(conflicts)
+
+
 def create_lesson(db: Session, lesson: schemas.LessonCreate) -> models.Lesson:
-    """Create a new lesson"""
+    """Create a new lesson; LessonConflictError if it overlaps the teacher's or student's lessons"""
+    end = lesson.end_time or lesson.start_time + timedelta(minutes=lesson.duration)
+    _check_free(db, lesson.start_time, end, lesson.teacher_id, lesson.student_id)
     db_lesson = models.Lesson(**lesson.dict())
     db.add(db_lesson)
+    db.flush()  # Apply the default duration before counting
+    _count_lessons(db, [(db_lesson, None)])
     db.commit()
     db.refresh(db_lesson)
     return db_lesson
 
 
 def start_lesson(db: Session, student_id: int, teacher_id: int) -> models.Lesson:
-    """Start a new lesson"""
+    """Start a new lesson; LessonConflictError if it overlaps the teacher's or student's lessons"""
+    now = datetime.utcnow()
+    # An open lesson is taken to last its planned (default) duration
+    _check_free(db, now, now + timedelta(minutes=schedules.DEFAULT_DURATION), teacher_id, student_id)
     db_lesson = models.Lesson(
-        student_id=student_id, teacher_id=teacher_id, start_time=datetime.utcnow()
+        student_id=student_id, teacher_id=teacher_id, start_time=now
     )
     db.add(db_lesson)
+    db.flush()  # Apply the default duration before counting
+    _count_lessons(db, [(db_lesson, None)])
     db.commit()
     db.refresh(db_lesson)
     return db_lesson
 
 
+def _close_lesson(db_lesson: models.Lesson, ended_at: datetime):
+    """Set end_time and the duration in minutes"""
+    db_lesson.end_time = ended_at
+    duration = (db_lesson.end_time - db_lesson.start_time).total_seconds() / 60
+    db_lesson.duration = int(duration)
+
+
 def end_lesson(db: Session, lesson_id: int) -> Optional[models.Lesson]:
     """End a lesson and calculate duration"""
     db_lesson = db.query(models.Lesson).filter(models.Lesson.id == lesson_id).first()
     if db_lesson and not db_lesson.end_time:
-        db_lesson.end_time = datetime.utcnow()
-        duration = (db_lesson.end_time - db_lesson.start_time).total_seconds() / 60
-        db_lesson.duration = int(duration)
+        before = _lesson_stats(db_lesson)
+        _close_lesson(db_lesson, datetime.utcnow())
+        _count_lessons(db, [(db_lesson, before)])
         db.commit()
         db.refresh(db_lesson)
     return db_lesson
 
 
-def get_lessons(
+def close_stale_lessons(
     db: Session,
-    skip: int = 0,
-    limit: int = 100,
+    opened_before: datetime,
+    duration_minutes: int,
+    batch_size: int = 500,
+    exclude: Optional[set] = None,
+) -> int:
+    """
+    Close lessons still open since before opened_before, one batch per
+    transaction, recording the planned duration (at most duration_minutes) and the
+    auto_closed flag
+    """
+    closed = 0
+    skip_ids = list(exclude or ())
+    while True:
+        query = db.query(models.Lesson).filter(
+            models.Lesson.end_time.is_(None), models.Lesson.start_time < opened_before
+        )
+        if skip_ids:
+            query = query.filter(models.Lesson.id.notin_(skip_ids))
+        lessons = query.order_by(models.Lesson.start_time).limit(batch_size).all()
+        if not lessons:
+            return closed
+        changes = []
+        for db_lesson in lessons:
+            changes.append((db_lesson, _lesson_stats(db_lesson)))
+            # Keep the planned duration; the cap only shortens longer ones
+            duration = min(db_lesson.duration or duration_minutes, duration_minutes)
+            db_lesson.end_time = db_lesson.start_time + timedelta(minutes=duration)
+            db_lesson.duration = duration
+            db_lesson.auto_closed = True
+        _count_lessons(db, changes)
+        db.commit()
+        closed += len(lessons)
+
+
+def get_lesson_parties(db: Session, lesson_id: int) -> Optional[tuple]:
+    """(teacher user id, student user id) of a lesson, None if it does not exist"""
+    lesson = db.query(models.Lesson.teacher_id, models.Lesson.student_id).filter(
+        models.Lesson.id == lesson_id
+    ).first()
+    if lesson is None:
+        return None
+    teacher, student = names.teacher(db, lesson.teacher_id), names.student(db, lesson.student_id)
+    return (teacher.user_id if teacher else None, student.user_id if student else None)
+
+
+def start_lessons(db: Session, started: Dict[int, datetime]) -> int:
+    """Move the start of open lessons to when their call actually began, in one transaction"""
+    if not started:
+        return 0
+    lessons = db.query(models.Lesson).filter(
+        models.Lesson.id.in_(list(started)), models.Lesson.end_time.is_(None)
+    ).all()
+    for db_lesson in lessons:
+        db_lesson.start_time = started[db_lesson.id]
+    _count_lessons(db, [(db_lesson, _lesson_stats(db_lesson)) for db_lesson in lessons])
+    db.commit()
+    return len(lessons)
+
+
+def end_lessons(db: Session, ended: Dict[int, datetime]) -> int:
+    """End several open lessons at the given times, in one transaction"""
+    if not ended:
+        return 0
+    lessons = db.query(models.Lesson).filter(
+        models.Lesson.id.in_(list(ended)), models.Lesson.end_time.is_(None)
+    ).all()
+    changes = []
+    for db_lesson in lessons:
+        changes.append((db_lesson, _lesson_stats(db_lesson)))
+        _close_lesson(db_lesson, ended[db_lesson.id])
+    _count_lessons(db, changes)
+    db.commit()
+    return len(lessons)
+
+
+def _filter_lessons(
+    query,
     student_id: Optional[int] = None,
     teacher_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-) -> List[models.Lesson]:
-    """Get list of lessons with optional filtering"""
-    query = db.query(models.Lesson)
+):
+    """Apply the standard lesson filters to a query"""
     if student_id:
         query = query.filter(models.Lesson.student_id == student_id)
     if teacher_id:
@@ -298,7 +771,86 @@ def get_lessons(
         query = query.filter(func.date(models.Lesson.date) >= start_date)
     if end_date:
         query = query.filter(func.date(models.Lesson.date) <= end_date)
-    return query.order_by(models.Lesson.date.desc()).offset(skip).limit(limit).all()
+    return query
+
+
+def get_lessons(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> List[models.Lesson]:
+    """Get list of lessons with optional filtering"""
+    query = _filter_lessons(
+        db.query(models.Lesson), student_id, teacher_id, start_date, end_date
+    )
+    query = after_keyset(query, models.Lesson.date, models.Lesson.id, after, descending=True)
+    return (
+        query.order_by(models.Lesson.date.desc(), models.Lesson.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+
+def get_lesson_rows(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """Get lesson list rows as column tuples (names are added from names.py)"""
+    query = db.query(
+        models.Lesson.id,
+        models.Lesson.student_id,
+        models.Lesson.teacher_id,
+        models.Lesson.date,
+        models.Lesson.start_time,
+        models.Lesson.end_time,
+        models.Lesson.duration,
+        models.Lesson.notes,
+        models.Lesson.auto_closed,
+        models.Lesson.created_at,
+    )
+    query = _filter_lessons(query, student_id, teacher_id, start_date, end_date)
+    query = after_keyset(query, models.Lesson.date, models.Lesson.id, after, descending=True)
+    return (
+        query.order_by(models.Lesson.date.desc(), models.Lesson.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+
+def export_lessons(
+    db: Session,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    batch_size: int = 1000,
+):
+    """Query lesson rows with student/teacher names for streaming export"""
+    query = db.query(
+        models.Lesson.id,
+        models.Lesson.student_id,
+        models.Student.name.label("student_name"),
+        models.Lesson.teacher_id,
+        models.Teacher.name.label("teacher_name"),
+        models.Lesson.date,
+        models.Lesson.start_time,
+        models.Lesson.end_time,
+        models.Lesson.duration,
+        models.Lesson.notes,
+        models.Lesson.auto_closed,
+    ).outerjoin(models.Student, models.Lesson.student_id == models.Student.id
+    ).outerjoin(models.Teacher, models.Lesson.teacher_id == models.Teacher.id)
+    query = _filter_lessons(query, student_id, teacher_id, start_date, end_date)
+    return query.order_by(models.Lesson.date.desc(), models.Lesson.id.desc()).yield_per(batch_size)
 
 
 def get_lesson(db: Session, lesson_id: int) -> Optional[models.Lesson]:
@@ -314,15 +866,9 @@ def count_lessons(
     end_date: Optional[date] = None,
 ) -> int:
     """Count lessons with optional filtering"""
-    query = db.query(models.Lesson)
-    if student_id:
-        query = query.filter(models.Lesson.student_id == student_id)
-    if teacher_id:
-        query = query.filter(models.Lesson.teacher_id == teacher_id)
-    if start_date:
-        query = query.filter(func.date(models.Lesson.date) >= start_date)
-    if end_date:
-        query = query.filter(func.date(models.Lesson.date) <= end_date)
+    query = _filter_lessons(
+        db.query(models.Lesson), student_id, teacher_id, start_date, end_date
+    )
     return query.count()
 
 
@@ -331,28 +877,120 @@ def create_payment(db: Session, payment: schemas.PaymentCreate) -> models.Paymen
     """Create a new payment record"""
     db_payment = models.Payment(**payment.dict())
     db.add(db_payment)
-    db.commit()
+    _commit_payment(db, db_payment, [payment.student_id])
     db.refresh(db_payment)
     return db_payment
 
 
-def get_payments(
-    db: Session,
-    skip: int = 0,
-    limit: int = 100,
+def _is_unique_violation(error: IntegrityError) -> bool:
+    """Whether an IntegrityError comes from a unique index rather than a FK or NOT NULL constraint"""
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    if code is not None:
+        return code == "23505"
+    message = str(error.orig).lower()
+    return "unique" in message or "duplicate" in message
+
+
+def _commit_payment(db: Session, db_payment: models.Payment, student_ids: List[int]) -> None:
+    """
+    Reconcile the students' fee status and commit a new or changed payment.
+    A second payment for the same student and month raises ValueError.
+    """
+    student_id, month = db_payment.student_id, db_payment.month
+    try:
+        reconcile_fee_status(db, student_ids)  # Flushes the payment first
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_unique_violation(e):
+            raise
+        raise ValueError(f"Student {student_id} already has a payment for {month}")
+
+
+def _filter_payments(
+    query,
     student_id: Optional[int] = None,
     status: Optional[str] = None,
     month: Optional[str] = None,
-) -> List[models.Payment]:
-    """Get list of payments with optional filtering"""
-    query = db.query(models.Payment)
+):
+    """Apply the standard payment filters to a query"""
     if student_id:
         query = query.filter(models.Payment.student_id == student_id)
     if status:
         query = query.filter(models.Payment.status == status)
     if month:
         query = query.filter(models.Payment.month == month)
-    return query.order_by(models.Payment.month.desc()).offset(skip).limit(limit).all()
+    return query
+
+
+def get_payments(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    student_id: Optional[int] = None,
+    status: Optional[str] = None,
+    month: Optional[str] = None,
+) -> List[models.Payment]:
+    """Get list of payments with optional filtering"""
+    query = _filter_payments(db.query(models.Payment), student_id, status, month)
+    query = after_keyset(query, models.Payment.month, models.Payment.id, after, descending=True)
+    return (
+        query.order_by(models.Payment.month.desc(), models.Payment.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+
+def get_payment_rows(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    student_id: Optional[int] = None,
+    status: Optional[str] = None,
+    month: Optional[str] = None,
+):
+    """Get payment list rows as column tuples (names are added from names.py)"""
+    query = db.query(
+        models.Payment.id,
+        models.Payment.student_id,
+        models.Payment.month,
+        models.Payment.amount,
+        models.Payment.status,
+        models.Payment.notes,
+        models.Payment.paid_date,
+        models.Payment.created_at,
+        models.Payment.updated_at,
+    )
+    query = _filter_payments(query, student_id, status, month)
+    query = after_keyset(query, models.Payment.month, models.Payment.id, after, descending=True)
+    return (
+        query.order_by(models.Payment.month.desc(), models.Payment.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+
+def export_payments(
+    db: Session,
+    student_id: Optional[int] = None,
+    status: Optional[str] = None,
+    month: Optional[str] = None,
+    batch_size: int = 1000,
+):
+    """Query payment rows with student names for streaming export"""
+    query = db.query(
+        models.Payment.id,
+        models.Payment.student_id,
+        models.Student.name.label("student_name"),
+        models.Payment.month,
+        models.Payment.amount,
+        models.Payment.status,
+        models.Payment.paid_date,
+        models.Payment.notes,
+        models.Payment.created_at,
+    ).outerjoin(models.Student, models.Payment.student_id == models.Student.id)
+    query = _filter_payments(query, student_id, status, month)
+    return query.order_by(models.Payment.month.desc(), models.Payment.id.desc()).yield_per(batch_size)
 
 
 def get_payment(db: Session, payment_id: int) -> Optional[models.Payment]:
@@ -366,12 +1004,13 @@ def update_payment(
     """Update a payment"""
     db_payment = get_payment(db, payment_id)
     if db_payment:
+        previous_student_id = db_payment.student_id
         update_data = payment.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_payment, key, value)
         if payment.status == models.FeeStatus.PAID and not db_payment.paid_date:
             db_payment.paid_date = datetime.utcnow()
-        db.commit()
+        _commit_payment(db, db_payment, list({previous_student_id, db_payment.student_id}))
         db.refresh(db_payment)
     return db_payment
 
@@ -381,21 +1020,176 @@ def delete_payment(db: Session, payment_id: int) -> bool:
     db_payment = get_payment(db, payment_id)
     if db_payment:
         db.delete(db_payment)
+        reconcile_fee_status(db, [db_payment.student_id])
         db.commit()
         return True
     return False
 
 
+def bulk_update_payments(
+    db: Session,
+    status: models.FeeStatus,
+    paid_date: Optional[datetime] = None,
+    payment_ids: Optional[List[int]] = None,
+    month: Optional[str] = None,
+    student_ids: Optional[List[int]] = None,
+) -> List[dict]:
+    """
+    Set status (and paid_date) on many payments with one UPDATE, selected by
+    id or by month/students. Marking paid stamps paid_date on payments that
+    have none. Returns a result per payment: updated, unchanged or not_found.
+    """
+    query = db.query(models.Payment.id, models.Payment.student_id, models.Payment.month, models.Payment.status)
+    if payment_ids is not None:
+        query = query.filter(models.Payment.id.in_(payment_ids))
+    if month is not None:
+        query = query.filter(models.Payment.month == month)
+    if student_ids is not None:
+        query = query.filter(models.Payment.student_id.in_(student_ids))
+    found = {row.id: row for row in query.all()}
+
+    changed = [row.id for row in found.values() if row.status != status or paid_date is not None]
+    if changed:
+        values = {models.Payment.status: status}
+        if paid_date is not None:
+            values[models.Payment.paid_date] = paid_date
+        elif status == models.FeeStatus.PAID:
+            values[models.Payment.paid_date] = func.coalesce(models.Payment.paid_date, datetime.utcnow())
+        # Name the touched months so only their cached reports are invalidated
+        months = tuple({found[payment_id].month for payment_id in changed})
+        db.query(models.Payment).execution_options(periods=months).filter(
+            models.Payment.id.in_(changed)
+        ).update(values, synchronize_session=False)
+        reconcile_fee_status(db, list({found[payment_id].student_id for payment_id in changed}))
+    db.commit()
+
+    changed_ids = set(changed)
+    results = [
+        {"id": payment_id, "result": "updated" if payment_id in changed_ids else "unchanged"}
+        for payment_id in found
+    ]
+    if payment_ids is not None:
+        results += [
+            {"id": payment_id, "result": "not_found"}
+            for payment_id in dict.fromkeys(payment_ids) if payment_id not in found
+        ]
+    return results
+
+
+def reconcile_fee_status(db: Session, student_ids: Optional[List[int]] = None, month: Optional[str] = None) -> int:
+    """
+    Recompute Student.fee_status from payments in one UPDATE: unpaid when any
+    payment is unpaid, paid otherwise. Students without payments keep their
+    flag. Limit to student_ids or to students billed in month, or pass neither
+    for a full rebuild. Does not commit; returns the number of students changed.
+    """
+    # Pending ORM changes to payments must be visible to the UPDATE
+    db.flush()
+    has_unpaid = exists().where(
+        models.Payment.student_id == models.Student.id,
+        models.Payment.status == models.FeeStatus.UNPAID,
+    )
+    has_payments = exists().where(models.Payment.student_id == models.Student.id)
+    computed = case(
+        (has_unpaid, literal(models.FeeStatus.UNPAID, models.Student.fee_status.type)),
+        else_=literal(models.FeeStatus.PAID, models.Student.fee_status.type),
+    )
+    query = db.query(models.Student).filter(
+        has_payments,
+        or_(models.Student.fee_status.is_(None), models.Student.fee_status != computed),
+    )
+    if student_ids is not None:
+        query = query.filter(models.Student.id.in_(student_ids))
+    if month is not None:
+        query = query.filter(models.Student.id.in_(
+            select(models.Payment.student_id).where(models.Payment.month == month)
+        ))
+    return query.update({models.Student.fee_status: computed}, synchronize_session=False)
+
+
 def count_payments(
-    db: Session, student_id: Optional[int] = None, status: Optional[str] = None
+    db: Session,
+    student_id: Optional[int] = None,
+    status: Optional[str] = None,
+    month: Optional[str] = None,
 ) -> int:
     """Count payments with optional filtering"""
-    query = db.query(models.Payment)
-    if student_id:
-        query = query.filter(models.Payment.student_id == student_id)
-    if status:
-        query = query.filter(models.Payment.status == status)
-    return query.count()
+    return _filter_payments(db.query(models.Payment), student_id, status, month).count()
+
+
+def _insert_ignoring_conflicts(db: Session, model):
+    """INSERT that skips rows violating a unique index (ON CONFLICT DO NOTHING) where supported"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    return insert(model)
+
+
+def run_billing(db: Session, month: str, notes: Optional[str] = None) -> int:
+    """
+    Create one unpaid payment for the month per active student (fee_amount > 0)
+    in a single INSERT ... SELECT. Students already billed for the month are
+    skipped, so re-running is safe; the unique (student_id, month) index with
+    ON CONFLICT DO NOTHING also covers runs racing each other. Returns the
+    number of payments created.
+    """
+    already_billed = exists().where(
+        models.Payment.student_id == models.Student.id, models.Payment.month == month
+    )
+    source = select(
+        models.Student.id,
+        literal(month, models.Payment.month.type),
+        models.Student.fee_amount,
+        literal(models.FeeStatus.UNPAID, models.Payment.status.type),
+        literal(notes, models.Payment.notes.type),
+    ).where(models.Student.fee_amount > 0, ~already_billed)
+    statement = _insert_ignoring_conflicts(db, models.Payment).from_select(
+        ["student_id", "month", "amount", "status", "notes"], source
+    )
+    result = db.execute(statement)
+    if result.rowcount:
+        reconcile_fee_status(db, month=month)
+        report_cache.invalidate(db, "payments", [month])
+    db.commit()
+    # Core statements bypass the ORM flush that bumps table versions
+    if result.rowcount:
+        versions.bump("payments", versions.period_key("payments", month))
+    return result.rowcount
+
+
+def _year_month(db: Session, column):
+    """SQL expression formatting a timestamp column as YYYY-MM"""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m", column)
+    return func.to_char(column, "YYYY-MM")
+
+
+def get_revenue_by_month(db: Session, months: List[str], by_teacher: bool = False):
+    """
+    Paid, pending and collected-late totals per billing month (optionally per
+    assigned teacher) in one grouped query. Collected late means paid after
+    the billing month ended.
+    """
+    paid = models.Payment.status == models.FeeStatus.PAID
+    late = and_(paid, _year_month(db, models.Payment.paid_date) > models.Payment.month)
+    columns = [
+        models.Payment.month,
+        func.coalesce(func.sum(case((paid, models.Payment.amount), else_=0.0)), 0.0).label("paid"),
+        func.coalesce(func.sum(case((paid, 0.0), else_=models.Payment.amount)), 0.0).label("pending"),
+        func.coalesce(func.sum(case((late, models.Payment.amount), else_=0.0)), 0.0).label("collected_late"),
+    ]
+    group_by = [models.Payment.month]
+    if by_teacher:
+        columns += [models.Student.assigned_teacher_id.label("teacher_id"), models.Teacher.name.label("teacher_name")]
+        group_by += [models.Student.assigned_teacher_id, models.Teacher.name]
+    query = db.query(*columns).filter(models.Payment.month.in_(months))
+    if by_teacher:
+        query = query.outerjoin(models.Student, models.Payment.student_id == models.Student.id).outerjoin(
+            models.Teacher, models.Student.assigned_teacher_id == models.Teacher.id
+        )
+    return query.group_by(*group_by).order_by(*group_by).all()
 
 
 # ============= Achievement CRUD =============
@@ -417,6 +1211,7 @@ def get_achievements(
     db: Session,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[tuple] = None,
     student_id: Optional[int] = None,
     teacher_id: Optional[int] = None,
 ) -> List[models.Achievement]:
@@ -426,7 +1221,38 @@ def get_achievements(
         query = query.filter(models.Achievement.student_id == student_id)
     if teacher_id:
         query = query.filter(models.Achievement.teacher_id == teacher_id)
-    return query.order_by(models.Achievement.awarded_date.desc()).offset(skip).limit(limit).all()
+    query = after_keyset(
+        query, models.Achievement.awarded_date, models.Achievement.id, after, descending=True
+    )
+    return (
+        query.order_by(models.Achievement.awarded_date.desc(), models.Achievement.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+
+def export_achievements(
+    db: Session,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    batch_size: int = 1000,
+):
+    """Query achievement rows with student/teacher names for streaming export"""
+    query = db.query(
+        models.Achievement.id,
+        models.Achievement.student_id,
+        models.Student.name.label("student_name"),
+        models.Achievement.teacher_id,
+        models.Teacher.name.label("teacher_name"),
+        models.Achievement.title,
+        models.Achievement.description,
+        models.Achievement.awarded_date,
+    ).outerjoin(models.Student, models.Achievement.student_id == models.Student.id
+    ).outerjoin(models.Teacher, models.Achievement.teacher_id == models.Teacher.id)
+    if student_id:
+        query = query.filter(models.Achievement.student_id == student_id)
+    if teacher_id:
+        query = query.filter(models.Achievement.teacher_id == teacher_id)
+    return query.order_by(models.Achievement.awarded_date.desc(), models.Achievement.id.desc()).yield_per(batch_size)
 
 
 def get_achievement(db: Session, achievement_id: int) -> Optional[models.Achievement]:
@@ -529,6 +1355,41 @@ def get_messages(
     return query.order_by(models.Message.sent_at.asc()).offset(skip).limit(limit).all()
 
 
+def export_messages(
+    db: Session,
+    user_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    batch_size: int = 1000,
+):
+    """Query message rows for streaming export"""
+    query = db.query(
+        models.Message.id,
+        models.Message.sender_id,
+        models.Message.receiver_id,
+        models.Message.student_id,
+        models.Message.teacher_id,
+        models.Message.message,
+        models.Message.is_read,
+        models.Message.sent_at,
+    )
+    if user_id:
+        query = query.filter(
+            (models.Message.sender_id == user_id) | (models.Message.receiver_id == user_id)
+        )
+    if student_id:
+        query = query.filter(models.Message.student_id == student_id)
+    if teacher_id:
+        query = query.filter(models.Message.teacher_id == teacher_id)
+    if start_date:
+        query = query.filter(func.date(models.Message.sent_at) >= start_date)
+    if end_date:
+        query = query.filter(func.date(models.Message.sent_at) <= end_date)
+    return query.order_by(models.Message.sent_at.asc(), models.Message.id.asc()).yield_per(batch_size)
+
+
 def get_conversations(db: Session, user_id: int) -> List[dict]:
     """Get all conversations for a user with summary info"""
     from sqlalchemy import func, case
@@ -565,23 +1426,12 @@ def get_conversations(db: Session, user_id: int) -> List[dict]:
             models.Message.is_read == False
         ).count()
 
-        # Get partner info
-        partner = db.query(models.User).filter(models.User.id == partner_id).first()
+        # Get partner info (profile name, else username)
+        partner = names.account(db, partner_id)
         if partner:
-            partner_name = partner.username
-            # Try to get actual name from teacher/student profile
-            if partner.role == models.UserRole.TEACHER:
-                teacher = db.query(models.Teacher).filter(models.Teacher.user_id == partner_id).first()
-                if teacher:
-                    partner_name = teacher.name
-            elif partner.role == models.UserRole.STUDENT:
-                student = db.query(models.Student).filter(models.Student.user_id == partner_id).first()
-                if student:
-                    partner_name = student.name
-
             conversations.append({
                 'user_id': partner_id,
-                'user_name': partner_name,
+                'user_name': partner.name,
                 'user_role': partner.role.value,
                 'last_message': last_message.message if last_message else '',
                 'last_message_time': last_message.sent_at if last_message else None,
@@ -0,0 +1,186 @@
+"""
+Minimal iCalendar (RFC 5545) writer for lesson feeds
+
+Output depends only on its input (DTSTAMP comes from the event itself, not
+the clock), so an unchanged calendar renders to identical bytes and keeps
+its ETag.
+"""
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+PRODID = "-//Online Academy//Lesson Calendar//EN"
+UID_DOMAIN = "online-academy"
+
+_WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+# Years of UTC offset changes listed in a VTIMEZONE
+TIMEZONE_YEARS = 3
+
+
+def escape(text: Optional[str]) -> str:
+    """Escape a TEXT property value"""
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line: str) -> str:
+    """Fold a content line to 75 octets, continuation lines starting with a space"""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Do not split a multi-byte character
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(parts)
+
+
+def utc_stamp(value: datetime) -> str:
+    """Naive UTC datetime as a UTC DATE-TIME value"""
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def duration(minutes: int) -> str:
+    return f"PT{int(minutes)}M"
+
+
+def lesson_event(uid: str, start: datetime, end: datetime, summary: str,
+                 description: Optional[str] = None) -> List[str]:
+    """VEVENT lines for one lesson (naive UTC times)"""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@{UID_DOMAIN}",
+        f"DTSTAMP:{utc_stamp(start)}",
+        f"DTSTART:{utc_stamp(start)}",
+        f"DTEND:{utc_stamp(end)}",
+        f"SUMMARY:{escape(summary)}",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{escape(description)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def weekly_event(uid: str, first_day: date, weekday: int, start_time: time, minutes: int,
+                 summary: str, timezone: str) -> List[str]:
+    """VEVENT lines for a weekly class at a wall-clock time in timezone, from first_day on"""
+    first = first_day + timedelta(days=(weekday - first_day.weekday()) % 7)
+    start = datetime.combine(first, start_time)
+    if timezone == "UTC":
+        dtstart = f"DTSTART:{utc_stamp(start)}"
+    else:
+        dtstart = f"DTSTART;TZID={timezone}:{start.strftime('%Y%m%dT%H%M%S')}"
+    return [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@{UID_DOMAIN}",
+        f"DTSTAMP:{utc_stamp(datetime.combine(first_day, time.min))}",
+        dtstart,
+        f"DURATION:{duration(minutes)}",
+        f"RRULE:FREQ=WEEKLY;BYDAY={_WEEKDAYS[weekday]}",
+        f"SUMMARY:{escape(summary)}",
+        "END:VEVENT",
+    ]
+
+
+def _offset(value: timedelta) -> str:
+    """UTC offset as +HHMM"""
+    sign = "-" if value < timedelta(0) else "+"
+    minutes = abs(int(value.total_seconds())) // 60
+    return f"{sign}{minutes // 60:02d}{minutes % 60:02d}"
+
+
+def _transitions(zone: ZoneInfo, start: datetime, end: datetime) -> Iterator[Tuple[datetime, datetime, datetime]]:
+    """(UTC instant, local time before, local time after) of each offset change in [start, end)"""
+    def local(instant):
+        return instant.astimezone(zone)
+
+    day = start
+    while day < end:
+        next_day = day + timedelta(days=1)
+        if local(day).utcoffset() != local(next_day).utcoffset():
+            # Narrow down to the minute; zones change offset on whole minutes
+            low, high = day, next_day
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if local(middle).utcoffset() == local(day).utcoffset():
+                    low = middle
+                else:
+                    high = middle
+            onset = high.replace(second=0, microsecond=0)
+            if local(onset).utcoffset() == local(day).utcoffset():
+                onset += timedelta(minutes=1)
+            yield onset, local(onset - timedelta(minutes=1)), local(onset)
+        day = next_day
+
+
+def _observance(before: datetime, after: datetime, onset: datetime) -> List[str]:
+    kind = "DAYLIGHT" if after.dst() else "STANDARD"
+    return [
+        f"BEGIN:{kind}",
+        f"DTSTART:{onset.strftime('%Y%m%dT%H%M%S')}",
+        f"TZOFFSETFROM:{_offset(before.utcoffset())}",
+        f"TZOFFSETTO:{_offset(after.utcoffset())}",
+        f"TZNAME:{escape(after.tzname())}",
+        f"END:{kind}",
+    ]
+
+
+def vtimezone(timezone: str, first_day: date) -> List[str]:
+    """
+    VTIMEZONE lines for a zone from first_day on, listing each offset change
+    of the next TIMEZONE_YEARS years as its own observance
+    """
+    zone = ZoneInfo(timezone)
+    # A day early, so the first observance covers first_day in zones ahead of UTC too
+    start = datetime.combine(first_day - timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    end = start + timedelta(days=366 * TIMEZONE_YEARS)
+    initial = start.astimezone(zone)
+    # Observance in force at the start of the feed
+    lines = ["BEGIN:VTIMEZONE", f"TZID:{timezone}"]
+    lines += _observance(initial, initial, initial.replace(tzinfo=None))
+    for onset, before, after in _transitions(zone, start, end):
+        # DTSTART is the onset as local time in the offset being left
+        lines += _observance(before, after, (onset + before.utcoffset()).replace(tzinfo=None))
+    lines.append("END:VTIMEZONE")
+    return lines
+
+
+def calendar(
+    name: str,
+    events: Iterable[List[str]],
+    timezone: str,
+    refresh_minutes: int = 60,
+    first_day: Optional[date] = None,
+) -> str:
+    """
+    A complete VCALENDAR document. Pass first_day when events use
+    TZID=timezone, so a matching VTIMEZONE from that day on is included.
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape(name)}",
+        f"X-WR-TIMEZONE:{timezone}",
+        f"REFRESH-INTERVAL;VALUE=DURATION:{duration(refresh_minutes)}",
+        f"X-PUBLISHED-TTL:{duration(refresh_minutes)}",
+    ]
+    if first_day is not None and timezone != "UTC":
+        lines.extend(vtimezone(timezone, first_day))
+    for event in events:
+        lines.extend(event)
+    lines.append("END:VCALENDAR")
+    return "".join(fold(line) + "\r\n" for line in lines)
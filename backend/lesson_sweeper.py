@@ -0,0 +1,43 @@
+"""
+Periodic sweeper for lessons whose end call never arrived
+
+Open lessons (end_time IS NULL) older than LESSON_MAX_OPEN_HOURS are closed
+with their planned duration, capped at LESSON_AUTO_CLOSE_MINUTES, and
+flagged auto_closed, so they stop counting as open in attendance and hours
+reports. Lessons with a call still in progress are left alone.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from config import settings
+from database import SessionLocal
+from lesson_tracker import tracker
+import crud
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_once(exclude: set = frozenset()) -> int:
+    """Close stale open lessons now; returns how many were closed"""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.LESSON_MAX_OPEN_HOURS)
+    db = SessionLocal()
+    try:
+        closed = crud.close_stale_lessons(
+            db, cutoff, settings.LESSON_AUTO_CLOSE_MINUTES, settings.LESSON_SWEEP_BATCH, exclude
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Lesson sweep failed: {e}")
+        return 0
+    finally:
+        db.close()
+    if closed:
+        logger.info(f"Auto-closed {closed} stale lessons")
+    return closed
+
+
+async def run_sweeper():
+    """Sweep every LESSON_SWEEP_INTERVAL seconds, off the event loop"""
+    while True:
+        await asyncio.to_thread(sweep_once, tracker.active_lessons())
+        await asyncio.sleep(settings.LESSON_SWEEP_INTERVAL)
@@ -0,0 +1,189 @@
+"""
+Automatic lesson start/end driven by video room membership
+
+Signaling rooms are named after lesson ids. Only members whose access
+token belongs to the lesson's teacher or student count, so joining a room
+by its id is not enough. When both parties are in a lesson's room the call
+start is recorded; when the room has stayed empty
+for LESSON_END_GRACE seconds the lesson is ended at the moment the pair
+broke up, so a brief reconnect does not split a lesson. Writes are
+collected and applied in batches by a background task instead of one
+transaction per event.
+
+With a backplane every process sees the whole room, so one of them writes:
+the lowest node id among those holding a party's connection, as last seen
+while anyone was present.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Set
+from config import settings
+from database import SessionLocal
+import crud
+import names
+import versions
+
+logger = logging.getLogger(__name__)
+
+# Lessons whose parties are kept in memory
+_CACHE_SIZE = 4096
+
+
+class LessonTracker:
+    def __init__(self):
+        # Lessons whose call is in progress (start recorded, not yet ended)
+        self._active: Set[int] = set()
+        # {lesson_id: when the room last dropped below two participants}
+        self._broken_at: Dict[int, datetime] = {}
+        self._end_timers: Dict[int, asyncio.TimerHandle] = {}
+        # Writes waiting for the next batch
+        self._starts: Dict[int, datetime] = {}
+        self._ends: Dict[int, datetime] = {}
+        self._writer: asyncio.Task = None
+        # {lesson_id: whether this process writes its start/end}
+        self._writing: Dict[int, bool] = {}
+        # {lesson_id: (version stamp, {teacher user id, student user id})}
+        self._parties: Dict[int, tuple] = {}
+        # {lesson_id: latest (users, node_id, time)} while its parties are looked up
+        self._lookups: Dict[int, tuple] = {}
+
+    def room_changed(self, room_id: str, users: Dict[int, Set[str]], node_id: str):
+        """
+        Called whenever the members of a signaling room change. users maps
+        the members' user ids to the nodes holding their connections;
+        node_id is this process
+        """
+        if not settings.LESSON_AUTO_TRACKING or not room_id.isdigit():
+            return
+        lesson_id = int(room_id)
+        if not users and lesson_id not in self._active and lesson_id not in self._lookups:
+            # No signed-in members, nothing to look up
+            self._writing.pop(lesson_id, None)
+            return
+        now = datetime.utcnow()
+        stamp = self._parties_stamp(lesson_id)
+        memo = self._parties.get(lesson_id)
+        if memo and memo[0] == stamp and lesson_id not in self._lookups:
+            self._apply(lesson_id, memo[1], users, node_id, now)
+            return
+        # Look the parties up off the event loop, then apply the latest membership
+        if lesson_id not in self._lookups:
+            asyncio.create_task(self._look_up(lesson_id, stamp))
+        self._lookups[lesson_id] = (users, node_id, now)
+
+    def _apply(self, lesson_id: int, parties: Optional[Set[int]], users: Dict[int, Set[str]],
+               node_id: str, now: datetime):
+        if not parties:
+            return
+        present = [users[user_id] for user_id in parties if user_id in users]
+        members = len(present)
+        if members:
+            self._writing[lesson_id] = min(set().union(*present)) == node_id
+
+        if members == len(parties) == 2:
+            self._cancel_end(lesson_id)
+            self._broken_at.pop(lesson_id, None)
+            if lesson_id not in self._active:
+                self._active.add(lesson_id)
+                # An end not yet written is taken back: the call simply continues
+                if self._ends.pop(lesson_id, None) is None and self._writing[lesson_id]:
+                    self._starts[lesson_id] = now
+                    self._schedule_write()
+            return
+
+        if lesson_id not in self._active:
+            if not members:
+                self._writing.pop(lesson_id, None)
+            return
+        self._broken_at.setdefault(lesson_id, now)
+        if members == 0:
+            if lesson_id not in self._end_timers:
+                self._end_timers[lesson_id] = asyncio.get_running_loop().call_later(
+                    settings.LESSON_END_GRACE, self._room_closed, lesson_id
+                )
+        else:
+            # Someone is back; wait for the room to fill or empty again
+            self._cancel_end(lesson_id)
+
+    @staticmethod
+    def _parties_stamp(lesson_id: int) -> tuple:
+        """Changes when this lesson or any teacher/student account link changes"""
+        return (*versions.period_stamp("lessons", f"lesson:{lesson_id}"), *versions.current(names.VERSION_KEY))
+
+    async def _look_up(self, lesson_id: int, stamp: tuple):
+        try:
+            found = await asyncio.to_thread(self._load_parties, lesson_id)
+        except Exception as e:
+            logger.error(f"Lesson tracker lookup failed: {e}")
+            self._lookups.pop(lesson_id, None)
+            return
+        parties = {user_id for user_id in found if user_id is not None} if found else None
+        if len(self._parties) >= _CACHE_SIZE:
+            self._parties.clear()
+        self._parties[lesson_id] = (stamp, parties)
+        users, node_id, now = self._lookups.pop(lesson_id)
+        self._apply(lesson_id, parties, users, node_id, now)
+
+    @staticmethod
+    def _load_parties(lesson_id: int):
+        db = SessionLocal()
+        try:
+            return crud.get_lesson_parties(db, lesson_id)
+        finally:
+            db.close()
+
+    def active_lessons(self) -> Set[int]:
+        """Lessons with a call in progress"""
+        return set(self._active)
+
+    def _cancel_end(self, lesson_id: int):
+        timer = self._end_timers.pop(lesson_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _room_closed(self, lesson_id: int):
+        """The room stayed empty past the grace period: end the lesson"""
+        self._end_timers.pop(lesson_id, None)
+        self._active.discard(lesson_id)
+        ended_at = self._broken_at.pop(lesson_id, datetime.utcnow())
+        if self._writing.pop(lesson_id, False):
+            self._ends[lesson_id] = ended_at
+            self._schedule_write()
+
+    def _schedule_write(self):
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_later())
+
+    async def _write_later(self):
+        while self._starts or self._ends:
+            await asyncio.sleep(settings.LESSON_WRITE_INTERVAL)
+            starts, ends = self._take()
+            await asyncio.to_thread(self._write, starts, ends)
+
+    def _take(self):
+        starts, self._starts = self._starts, {}
+        ends, self._ends = self._ends, {}
+        return starts, ends
+
+    def flush(self):
+        """Write pending starts and ends now (used at shutdown)"""
+        self._write(*self._take())
+
+    def _write(self, starts: Dict[int, datetime], ends: Dict[int, datetime]):
+        """Apply a batch of starts and ends in one database session"""
+        if not starts and not ends:
+            return
+        db = SessionLocal()
+        try:
+            crud.start_lessons(db, starts)
+            crud.end_lessons(db, ends)
+            logger.info(f"Lesson tracker wrote {len(starts)} starts, {len(ends)} ends")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Lesson tracker write failed: {e}")
+        finally:
+            db.close()
+
+
+tracker = LessonTracker()
@@ -1,20 +1,37 @@
 """
 Main FastAPI application for Online Academy Management System
 """
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
-from routers import auth, teachers, students, lessons, payments, dashboard, achievements, messages
+from routers import auth, teachers, students, lessons, payments, dashboard, achievements, messages, exports, presence, schedule, calendar
 from signaling_server import router as signaling_router
+from lesson_tracker import tracker as lesson_tracker
+from lesson_sweeper import run_sweeper
+from config import settings
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(run_sweeper()) if settings.LESSON_SWEEP_INTERVAL > 0 else None
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    # Write lesson starts/ends still waiting for their batch
+    lesson_tracker.flush()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Online Academy Management System",
     description="Backend API for managing students, teachers, lessons, and payments",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware configuration
@@ -24,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "ETag"],
 )
 
 # Include routers
@@ -35,6 +53,10 @@ app.include_router(payments.router)
 app.include_router(dashboard.router)
 app.include_router(achievements.router)
 app.include_router(messages.router)
+app.include_router(exports.router)
+app.include_router(presence.router)
+app.include_router(schedule.router)
+app.include_router(calendar.router)
 app.include_router(signaling_router)
 
 
@@ -0,0 +1,61 @@
+"""
+Parse existing free-text student schedules into schedule slots
+
+Usage:
+    python migrate_schedules.py [--dry-run]
+
+Safe to re-run: each student's slots are rebuilt from its schedule text.
+Schedules that cannot be parsed are listed so they can be corrected by hand.
+"""
+import argparse
+from sqlalchemy.orm import selectinload
+from database import SessionLocal, Base, engine
+import crud
+import models
+
+BATCH_SIZE = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate student schedule text to schedule slots")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    migrated, failed = 0, []
+    try:
+        last_id = 0
+        while True:
+            students = (
+                db.query(models.Student)
+                .options(selectinload(models.Student.schedule_slots))
+                .filter(models.Student.id > last_id, models.Student.schedule.isnot(None))
+                .order_by(models.Student.id)
+                .limit(BATCH_SIZE)
+                .all()
+            )
+            if not students:
+                break
+            for student in students:
+                if crud.sync_schedule_slots(student):
+                    migrated += 1
+                else:
+                    failed.append((student.id, student.name, student.schedule))
+            last_id = students[-1].id
+            if args.dry_run:
+                db.rollback()
+            else:
+                db.commit()
+            db.expunge_all()
+
+        verb = "Would migrate" if args.dry_run else "Migrated"
+        print(f"{verb} schedules of {migrated} students")
+        for student_id, name, schedule in failed:
+            print(f"  could not parse student {student_id} ({name}): {schedule!r}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
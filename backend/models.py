@@ -1,7 +1,7 @@
 """
 Database models for the Online Academy Management System
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Time, ForeignKey, Enum, Text, Index, UniqueConstraint, false, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -37,6 +37,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(Enum(UserRole), default=UserRole.TEACHER)
     teacher_id = Column(Integer, ForeignKey("teachers.id"), nullable=True)
+    calendar_token = Column(String, nullable=True, unique=True, index=True)  # Secret in iCal feed URLs
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -55,6 +56,12 @@ class Teacher(Base):
     email = Column(String, nullable=True)
     status = Column(Enum(TeacherStatus), default=TeacherStatus.ACTIVE)
     user_id = Column(Integer, nullable=True)  # Link to User table
+    # Lifetime counters kept up to date by crud.py (rebuild with rebuild_stats.py)
+    lesson_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    total_minutes = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    completed_lessons = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_lesson_at = Column(DateTime(timezone=True), nullable=True)
+    active_students = Column(Integer, nullable=False, default=0, server_default=text("0"))  # Assigned students
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -74,11 +81,16 @@ class Student(Base):
     parent_contact = Column(String, nullable=True)
     teams_id = Column(String, nullable=True, index=True)
     assigned_teacher_id = Column(Integer, ForeignKey("teachers.id"), nullable=True)
-    schedule = Column(String, nullable=True)  # e.g., "Mon-Wed-Fri 3:00 PM"
+    schedule = Column(String, nullable=True)  # e.g., "Mon-Wed-Fri 3:00 PM"; parsed into schedule_slots
     fee_amount = Column(Float, default=0.0)
     fee_status = Column(Enum(FeeStatus), default=FeeStatus.UNPAID)
     notes = Column(Text, nullable=True)
     user_id = Column(Integer, nullable=True)  # Link to User table
+    # Lifetime counters kept up to date by crud.py (rebuild with rebuild_stats.py)
+    lesson_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    total_minutes = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    completed_lessons = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_lesson_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -87,11 +99,44 @@ class Student(Base):
     lessons = relationship("Lesson", back_populates="student")
     payments = relationship("Payment", back_populates="student")
     achievements = relationship("Achievement", back_populates="student")
+    schedule_slots = relationship("ScheduleSlot", back_populates="student", cascade="all, delete-orphan")
+
+
+class ScheduleSlot(Base):
+    """Weekly recurring lesson time of a student, parsed from Student.schedule"""
+    __tablename__ = "schedule_slots"
+    __table_args__ = (
+        Index("ix_schedule_slots_weekday_start", "weekday", "start_time"),  # Calendar lookups
+        Index("ix_schedule_slots_teacher_weekday_start", "teacher_id", "weekday", "start_time"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    teacher_id = Column(Integer, ForeignKey("teachers.id"), nullable=True)  # Student's assigned teacher
+    weekday = Column(Integer, nullable=False)  # 0 = Monday
+    start_time = Column(Time, nullable=False)
+    duration = Column(Integer, nullable=False, default=30)  # Duration in minutes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    student = relationship("Student", back_populates="schedule_slots")
+    teacher = relationship("Teacher")
 
 
 class Lesson(Base):
     """Lesson tracking model"""
     __tablename__ = "lessons"
+    __table_args__ = (
+        Index("ix_lessons_date_id", "date", "id"),  # Keyset pagination
+        # Overlap checks and free-slot search
+        Index("ix_lessons_teacher_start_end", "teacher_id", "start_time", "end_time"),
+        Index("ix_lessons_student_start_end", "student_id", "start_time", "end_time"),
+        # Open lessons only; used by the stale-lesson sweeper
+        Index(
+            "ix_lessons_open_start_time", "start_time",
+            postgresql_where=text("end_time IS NULL"), sqlite_where=text("end_time IS NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -101,6 +146,7 @@ class Lesson(Base):
     end_time = Column(DateTime(timezone=True), nullable=True)
     duration = Column(Integer, default=30)  # Duration in minutes
     notes = Column(Text, nullable=True)
+    auto_closed = Column(Boolean, nullable=False, default=False, server_default=false())  # Closed by the sweeper
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -112,6 +158,11 @@ class Lesson(Base):
 class Payment(Base):
     """Payment tracking model"""
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_month_id", "month", "id"),  # Keyset pagination
+        # One payment per student and month; keeps concurrent billing runs idempotent
+        Index("ix_payments_student_month", "student_id", "month", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -130,6 +181,7 @@ class Payment(Base):
 class Achievement(Base):
     """Achievement/Award tracking model"""
     __tablename__ = "achievements"
+    __table_args__ = (Index("ix_achievements_awarded_date_id", "awarded_date", "id"),)  # Keyset pagination
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -165,3 +217,18 @@ class Message(Base):
     receiver = relationship("User", foreign_keys=[receiver_id])
     student = relationship("Student")
     teacher = relationship("Teacher")
+
+
+class ReportCache(Base):
+    """Stored report results for closed days and months (see report_cache.py)"""
+    __tablename__ = "report_cache"
+    __table_args__ = (
+        UniqueConstraint("report", "period", "entity", name="uq_report_cache_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    report = Column(String, nullable=False)  # e.g. "teacher_hours"
+    period = Column(String, nullable=False)  # "YYYY-MM" or "YYYY-MM-DD"
+    entity = Column(String, nullable=False, default="")  # e.g. teacher id; "" for academy-wide
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,102 @@
+"""
+In-process id -> name maps for teachers, students and user accounts
+
+Responses show a teacher's or student's name next to ids on almost every
+row. Those tables are small and names rarely change, so each map is loaded
+with one query on first use and kept in memory. The create/update/delete
+functions in crud.py call changed() so the maps are reloaded after their
+commit; other writes (fee status, counters) leave them alone.
+"""
+from typing import Dict, NamedTuple, Optional
+from sqlalchemy.orm import Session
+import models
+import versions
+
+# Version key bumped by crud.py when a name, account or profile link changes
+VERSION_KEY = "names"
+
+UNKNOWN = "Unknown"
+
+
+class Profile(NamedTuple):
+    name: str
+    user_id: Optional[int]
+
+
+class Account(NamedTuple):
+    name: str  # Teacher/student profile name, else the username
+    role: models.UserRole
+
+
+# {map name: (version stamp, {id: entry})}
+_maps: Dict[str, tuple] = {}
+
+
+def changed(db: Session) -> None:
+    """Reload the maps once db's transaction commits"""
+    versions.touch(db, VERSION_KEY)
+
+
+def _profiles(db: Session, model) -> Dict[int, Profile]:
+    return {row.id: Profile(row.name, row.user_id) for row in db.query(model.id, model.name, model.user_id)}
+
+
+def _accounts(db: Session) -> Dict[int, Account]:
+    names = {
+        user_id: name
+        for model in (models.Teacher, models.Student)
+        for name, user_id in _profiles(db, model).values()
+        if user_id is not None
+    }
+    return {
+        row.id: Account(names.get(row.id, row.username), row.role)
+        for row in db.query(models.User.id, models.User.username, models.User.role)
+    }
+
+
+_LOADERS = {
+    "teachers": lambda db: _profiles(db, models.Teacher),
+    "students": lambda db: _profiles(db, models.Student),
+    "users": _accounts,
+}
+
+
+def _map(db: Session, name: str) -> dict:
+    stamp = versions.current(VERSION_KEY)
+    memo = _maps.get(name)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    entries = _LOADERS[name](db)
+    _maps[name] = (stamp, entries)
+    return entries
+
+
+def teacher(db: Session, teacher_id: Optional[int]) -> Optional[Profile]:
+    return _map(db, "teachers").get(teacher_id)
+
+
+def student(db: Session, student_id: Optional[int]) -> Optional[Profile]:
+    return _map(db, "students").get(student_id)
+
+
+def account(db: Session, user_id: Optional[int]) -> Optional[Account]:
+    return _map(db, "users").get(user_id)
+
+
+def teacher_name(db: Session, teacher_id: Optional[int], default: Optional[str] = UNKNOWN) -> Optional[str]:
+    profile = teacher(db, teacher_id)
+    return profile.name if profile else default
+
+
+def student_name(db: Session, student_id: Optional[int], default: Optional[str] = UNKNOWN) -> Optional[str]:
+    profile = student(db, student_id)
+    return profile.name if profile else default
+
+
+def add_names(db: Session, item: dict) -> dict:
+    """Fill student_name/teacher_name of a row dict from its student_id/teacher_id"""
+    if "student_id" in item:
+        item["student_name"] = student_name(db, item["student_id"])
+    if "teacher_id" in item:
+        item["teacher_name"] = teacher_name(db, item["teacher_id"])
+    return item
@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints
+"""
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response, status
+from sqlalchemy import String, and_, or_, type_coerce
+
+# Seconds a cached total count stays valid
+TOTAL_COUNT_TTL = 30
+
+_count_cache: Dict[Hashable, Tuple[float, int]] = {}
+_COUNT_CACHE_SIZE = 1024
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    """Build an opaque cursor from the last row's sort key and id"""
+    payload = {"i": row_id}
+    if isinstance(sort_value, datetime):
+        payload["d"] = sort_value.isoformat()
+    else:
+        payload["k"] = sort_value
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """Decode a cursor into a (sort_value, id) tuple, or None when absent"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        sort_value = datetime.fromisoformat(payload["d"]) if "d" in payload else payload.get("k")
+        return sort_value, int(payload["i"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def after_keyset(query, sort_column, id_column, after: Optional[tuple], descending: bool = False):
+    """Restrict a query to rows strictly after the (sort_value, id) position"""
+    if after is None:
+        return query
+    sort_value, row_id = after
+    if sort_column is None:
+        return query.filter(id_column < row_id if descending else id_column > row_id)
+    if isinstance(sort_value, datetime) and query.session.get_bind().dialect.name == "sqlite":
+        # SQLite keeps server_default timestamps as text without fractional seconds,
+        # so compare as text in that format or ties on the sort key are never equal
+        sort_column = type_coerce(sort_column, String)
+        sort_value = sort_value.isoformat(" ")
+    if descending:
+        return query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id),
+        ))
+    return query.filter(or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > row_id),
+    ))
+
+
+def cached_count(key: Hashable, count: Callable[[], int]) -> int:
+    """Return a total count, recomputing it at most once per TTL for the same filters"""
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached and now - cached[0] < TOTAL_COUNT_TTL:
+        return cached[1]
+    total = count()
+    if len(_count_cache) >= _COUNT_CACHE_SIZE:
+        # Drop expired counts; if every entry is still fresh, start over
+        for stale in [k for k, (at, _) in _count_cache.items() if now - at >= TOTAL_COUNT_TTL]:
+            del _count_cache[stale]
+        if len(_count_cache) >= _COUNT_CACHE_SIZE:
+            _count_cache.clear()
+    _count_cache[key] = (now, total)
+    return total
+
+
+def set_page_headers(
+    response: Response,
+    items: Sequence,
+    limit: int,
+    sort_key: Callable[[object], object],
+    total: Optional[int] = None,
+) -> Response:
+    """
+    Attach X-Next-Cursor (when the page is full) and X-Total-Count headers.
+    sort_key returns the sort value of an item, or None for id-only ordering.
+    """
+    if len(items) == limit:
+        last = items[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(sort_key(last), last.id)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return response
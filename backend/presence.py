@@ -0,0 +1,123 @@
+"""
+In-memory presence index: who is online and which lesson room they are in
+
+Fed by signaling registrations and presence socket connections, read by
+GET /api/presence and pushed to /ws/presence subscribers. Nothing here
+touches the database; the index lives in process memory, so with several
+workers each one only knows its own sockets.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Change events buffered per subscriber before it is resynced
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    """A consumer of presence changes for a set of watched users"""
+
+    def __init__(self):
+        self.watched: Set[int] = set()
+        # Users whose room the subscriber may see; None for all
+        self.visible: Optional[Set[int]] = None
+        # Change events; None means "resend a full snapshot"
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def resync(self):
+        """Replace any backlog with a request for a full snapshot"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class PresenceIndex:
+    def __init__(self):
+        # {session key: (user_id, room)}; one key per live socket
+        self._sessions: Dict[str, Tuple[int, Optional[str]]] = {}
+        # {user_id: {session key: room}}
+        self._by_user: Dict[int, Dict[str, Optional[str]]] = {}
+        # {user_id: time of the last online/room change}
+        self._since: Dict[int, datetime] = {}
+        self._subscribers: Set[Subscription] = set()
+
+    def _status(self, user_id: int) -> dict:
+        sessions = self._by_user.get(user_id)
+        rooms = [room for room in (sessions or {}).values() if room is not None]
+        room = rooms[-1] if rooms else None
+        since = self._since.get(user_id)
+        return {
+            "online": bool(sessions),
+            "lesson_id": int(room) if room is not None and room.isdigit() else None,
+            "room": room,
+            "since": since.isoformat() if since else None,
+        }
+
+    def set(self, key: str, user_id: int, room: Optional[str] = None):
+        """Record (or move) a live session of a user"""
+        previous = self._sessions.get(key)
+        if previous == (user_id, room):
+            return
+        if previous is not None and previous[0] != user_id:
+            self.clear(key)
+            previous = None
+        before = self._status(user_id)
+        self._sessions[key] = (user_id, room)
+        sessions = self._by_user.setdefault(user_id, {})
+        # Re-insert so the latest room wins when a user has several sessions
+        sessions.pop(key, None)
+        sessions[key] = room
+        self._changed(user_id, before)
+
+    def clear(self, key: str):
+        """Forget a session whose socket closed"""
+        entry = self._sessions.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0]
+        before = self._status(user_id)
+        sessions = self._by_user.get(user_id, {})
+        sessions.pop(key, None)
+        if not sessions:
+            self._by_user.pop(user_id, None)
+        self._changed(user_id, before)
+
+    def _changed(self, user_id: int, before: dict):
+        after = self._status(user_id)
+        if (after["online"], after["room"]) == (before["online"], before["room"]):
+            return
+        self._since[user_id] = datetime.now(timezone.utc)
+        self._publish(user_id, self._status(user_id))
+
+    def snapshot(self, user_ids: Iterable[int]) -> Dict[int, dict]:
+        """Current status of each requested user"""
+        return {user_id: self._status(user_id) for user_id in user_ids}
+
+    def online_count(self) -> int:
+        return len(self._by_user)
+
+    def subscribe(self, user_ids: Iterable[int] = ()) -> Subscription:
+        subscription = Subscription()
+        subscription.watched.update(user_ids)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def _publish(self, user_id: int, status: dict):
+        for subscription in list(self._subscribers):
+            if user_id not in subscription.watched:
+                continue
+            try:
+                subscription.queue.put_nowait({"user_id": user_id, **status})
+            except asyncio.QueueFull:
+                # The consumer fell behind; replace its backlog with a resync marker
+                logger.warning("Presence subscriber overflowed; resyncing")
+                subscription.resync()
+
+
+presence = PresenceIndex()
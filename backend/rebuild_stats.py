@@ -0,0 +1,29 @@
+"""
+Recompute the lesson and student counters on students and teachers from scratch
+
+Usage:
+    python rebuild_stats.py
+
+Run once after adding the counter columns, and whenever lessons were written
+outside crud.py (imports, manual SQL).
+"""
+from database import SessionLocal, Base, engine
+import crud
+import models
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        crud.rebuild_stat_counters(db)
+        db.commit()
+        students = db.query(models.Student).count()
+        teachers = db.query(models.Teacher).count()
+        print(f"Stat counters rebuilt for {students} students and {teachers} teachers")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
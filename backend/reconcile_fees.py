@@ -0,0 +1,23 @@
+"""
+Recompute every student's fee status from their payments (nightly full rebuild)
+
+Usage:
+    python reconcile_fees.py
+"""
+from database import SessionLocal, Base, engine
+import crud
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        changed = crud.reconcile_fee_status(db)
+        db.commit()
+        print(f"Fee status reconciled: {changed} students changed")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
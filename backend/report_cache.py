@@ -0,0 +1,130 @@
+"""
+Persistent cache for reports over closed periods
+
+Hours and revenue for a finished day or month only change when a
+back-dated lesson or payment is written. Reports registered here are
+computed once per (report, entity, period), stored in the report_cache
+table and read from there afterwards. Periods that are still open are never
+stored. A write that touches a closed period (found through the period
+tracking in versions.py) deletes that period's rows in the same transaction.
+"""
+import json
+import re
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+import versions
+
+_table = models.ReportCache.__table__
+
+# Period names this cache stores; other partitions in versions keys are ignored
+_PERIOD = re.compile(r"\d{4}-\d{2}(-\d{2})?$")
+
+# {report: source table}; the table must be registered with versions.track_period()
+_sources: Dict[str, str] = {}
+
+
+def register(report: str, table: str):
+    """Declare that a report is computed from rows of table"""
+    _sources[report] = table
+
+
+def is_closed(period: str, today: Optional[date] = None) -> bool:
+    """Whether a "YYYY-MM" month or "YYYY-MM-DD" day has ended"""
+    today = (today or date.today()).isoformat()
+    return period < today[:len(period)]
+
+
+def _stamp(table: str, periods: Iterable[str]) -> tuple:
+    keys = [versions.period_key(table, period) for period in periods]
+    return versions.current(versions.period_key(table, versions.ANY_PERIOD), *keys)
+
+
+def cached(
+    db: Session,
+    report: str,
+    entity,
+    periods: List[str],
+    compute: Callable[[List[str]], Dict[str, object]],
+) -> Dict[str, object]:
+    """
+    Values of a report for one entity over several periods. Closed periods
+    come from the cache; the others are passed to compute() in one call,
+    which returns {period: JSON-serializable value}. Newly computed closed
+    periods are stored.
+    """
+    entity = "" if entity is None else str(entity)
+    values = {}
+    closed = [period for period in periods if is_closed(period)]
+    if closed:
+        rows = db.execute(
+            select(_table.c.period, _table.c.payload).where(
+                _table.c.report == report, _table.c.entity == entity, _table.c.period.in_(closed)
+            )
+        )
+        values = {period: json.loads(payload) for period, payload in rows}
+
+    missing = [period for period in periods if period not in values]
+    if not missing:
+        return values
+    stamp = _stamp(_sources[report], missing)
+    fresh = compute(missing)
+    values.update(fresh)
+
+    store = [
+        {"report": report, "entity": entity, "period": period, "payload": json.dumps(fresh[period])}
+        for period in missing
+        if period in fresh and is_closed(period)
+    ]
+    # Skip storing if a write to these periods committed while computing
+    if store and _stamp(_sources[report], missing) == stamp:
+        # Own session, so committing does not expire objects the caller holds
+        with Session(db.get_bind()) as writer:
+            try:
+                writer.execute(insert(_table), store)
+                writer.commit()
+            except IntegrityError:
+                # A concurrent request stored them first
+                writer.rollback()
+    return values
+
+
+def _delete(session: Session, keys: Iterable[str]):
+    """Delete cached rows of reports affected by writes to these "table@period" keys"""
+    everything, by_period = set(), {}
+    for key in keys:
+        table, _, period = key.partition("@")
+        reports = [report for report, source in _sources.items() if source == table]
+        if not reports:
+            continue
+        if period == versions.ANY_PERIOD:
+            everything.update(reports)
+        elif _PERIOD.match(period) and is_closed(period):
+            by_period.setdefault(period, set()).update(reports)
+
+    if everything:
+        session.execute(delete(_table).where(_table.c.report.in_(everything)))
+    for period, reports in by_period.items():
+        reports -= everything
+        if reports:
+            session.execute(delete(_table).where(_table.c.report.in_(reports), _table.c.period == period))
+
+
+def invalidate(db: Session, table: str, periods: Iterable[str]):
+    """Drop cached reports for periods of table written with Core statements (before commit)"""
+    _delete(db, [versions.period_key(table, period) for period in periods])
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flush(session, flush_context):
+    _delete(session, versions.periods_of((*session.new, *session.dirty, *session.deleted)))
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _invalidate_bulk(context):
+    if context.result.rowcount:
+        _delete(context.session, versions.bulk_periods(context))
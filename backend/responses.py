@@ -0,0 +1,50 @@
+"""
+Fast JSON responses for list endpoints
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Callable, Iterable, List, Optional, Type
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+
+def _default(value):
+    """Encode values the stdlib json module does not handle natively"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, falling back to the stdlib encoder"""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def rows_response(
+    rows: Iterable, schema: Type[BaseModel], enrich: Optional[Callable[[dict], dict]] = None
+) -> FastJSONResponse:
+    """
+    Serialize column-tuple rows straight to JSON, passing each row dict
+    through enrich() first if given (e.g. to add names).
+    Rows are only validated against the response schema in DEBUG mode.
+    """
+    items: List[dict] = [row._asdict() for row in rows]
+    if enrich is not None:
+        items = [enrich(item) for item in items]
+    if settings.DEBUG:
+        for item in items:
+            schema.model_validate(item)
+    return FastJSONResponse(items)
@@ -1,7 +1,7 @@
 """
 Achievement/Award API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
@@ -9,6 +9,8 @@ from auth import get_current_teacher_user, get_current_user
 import schemas
 import crud
 import models
+import pagination
+import versions
 
 router = APIRouter(prefix="/api/achievements", tags=["Achievements"])
 
@@ -53,8 +55,12 @@ def create_achievement(
 
 @router.get("/", response_model=List[schemas.AchievementResponse])
 def get_achievements(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_total: bool = Query(False, description="Return X-Total-Count header"),
     student_id: Optional[int] = Query(None, description="Filter by student ID"),
     teacher_id: Optional[int] = Query(None, description="Filter by teacher ID"),
     db: Session = Depends(get_db),
@@ -66,6 +72,12 @@ def get_achievements(
     - Teacher: Can see achievements they awarded or for their students
     - Student: Can see only their own achievements
     """
+    etag = versions.etag_for(request, "achievements", "students", "teachers", scope=current_user.id)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     # Role-based filtering
     if current_user.role == models.UserRole.STUDENT:
         # Students can only see their own achievements
@@ -87,9 +99,19 @@ def get_achievements(
         db=db,
         skip=skip,
         limit=limit,
+        after=pagination.decode_cursor(cursor),
         student_id=student_id,
         teacher_id=teacher_id
     )
+    total = None
+    if include_total:
+        total = pagination.cached_count(
+            ("achievements", student_id, teacher_id),
+            lambda: crud.count_achievements(db, student_id=student_id, teacher_id=teacher_id),
+        )
+    pagination.set_page_headers(
+        response, achievements, limit, lambda achievement: achievement.awarded_date, total
+    )
     return achievements
 
 
@@ -55,49 +55,13 @@ def signup(request: schemas.SignupRequest, db: Session = Depends(get_db)):
             detail="Only teachers and students can signup. Admins must be created by system administrator.",
         )
 
-    # Create user account
-    hashed_password = get_password_hash(request.password)
-    db_user = models.User(
-        username=request.username,
-        email=request.email,
-        hashed_password=hashed_password,
-        role=request.role,
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    # Create profile based on role
-    if request.role == models.UserRole.TEACHER:
-        # Create teacher profile
-        teacher_profile = models.Teacher(
-            name=request.name,
-            subject=request.subject,
-            phone=request.phone,
-            email=request.email,
-            user_id=db_user.id
-        )
-        db.add(teacher_profile)
-        db.commit()
-        db.refresh(teacher_profile)
-
-    elif request.role == models.UserRole.STUDENT:
-        # Create student profile
-        student_profile = models.Student(
-            name=request.name,
-            parent_contact=request.parent_contact,
-            teams_id=request.teams_id,
-            fee_status=models.FeeStatus.UNPAID,
-            user_id=db_user.id
-        )
-        db.add(student_profile)
-        db.commit()
-        db.refresh(student_profile)
+    # Create user account and profile in one transaction
+    crud.signup(db, request)
 
     return {
         "message": "Signup successful! You can now login.",
-        "username": db_user.username,
-        "role": db_user.role.value
+        "username": request.username,
+        "role": request.role.value
     }
 
 
@@ -118,7 +82,7 @@ def login(
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role.value}, expires_delta=access_token_expires
+        data={"sub": user.username, "role": user.role.value, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer", "role": user.role.value}
 
@@ -0,0 +1,143 @@
+"""
+iCalendar feed API endpoints
+"""
+import hashlib
+from datetime import date, timedelta
+from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+from database import get_db
+from auth import get_current_user
+from config import settings
+import schemas
+import crud
+import models
+import ical
+import availability
+import versions
+
+router = APIRouter(prefix="/api/calendar", tags=["Calendar"])
+
+# Past lessons kept in a feed
+FEED_HISTORY_DAYS = 90
+
+# {token: (version stamp, calendar owner)}; only valid tokens
+_owners: Dict[str, tuple] = {}
+# {(kind, profile id): (version stamp, etag, body)}
+_feeds: Dict[tuple, tuple] = {}
+_CACHE_SIZE = 4096
+
+
+def _feed_info(request: Request, token: str) -> dict:
+    return {"token": token, "url": str(request.url_for("get_calendar_feed", token=token))}
+
+
+@router.get("/feed", response_model=schemas.CalendarFeed)
+def get_feed_link(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Subscription link to the current user's lesson calendar (Teacher/Student)"""
+    if crud.get_calendar_owner(db, current_user) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No teacher or student profile for this user")
+    token = current_user.calendar_token or crud.rotate_calendar_token(db, current_user)
+    return _feed_info(request, token)
+
+
+@router.post("/feed/rotate", response_model=schemas.CalendarFeed)
+def rotate_feed_link(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Replace the current user's calendar link; the old link stops working"""
+    if crud.get_calendar_owner(db, current_user) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No teacher or student profile for this user")
+    old_token = current_user.calendar_token
+    token = crud.rotate_calendar_token(db, current_user)
+    _owners.pop(old_token, None)
+    return _feed_info(request, token)
+
+
+def _owner_for(db: Session, token: str):
+    """(kind, profile id, name) for a feed token, kept until users or profiles change"""
+    stamp = versions.current("users", "teachers", "students")
+    memo = _owners.get(token)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    user = crud.get_user_by_calendar_token(db, token)
+    owner = crud.get_calendar_owner(db, user) if user else None
+    # Only cache hits, so guessed tokens cannot fill the cache
+    if owner is not None:
+        if len(_owners) >= _CACHE_SIZE:
+            _owners.clear()
+        _owners[token] = (stamp, owner)
+    return owner
+
+
+def _feed_stamp(kind: str, profile_id: int) -> tuple:
+    """Changes when this owner's lessons or schedule slots (or any names) change, and daily"""
+    owner = f"{kind}:{profile_id}"
+    return (
+        *versions.period_stamp("lessons", owner),
+        *versions.period_stamp("schedule_slots", owner),
+        *versions.current("teachers", "students"),
+        date.today().isoformat(),
+    )
+
+
+def _render_feed(db: Session, kind: str, profile_id: int, name: str) -> str:
+    owner = {f"{kind}_id": profile_id}
+    other = "student_name" if kind == "teacher" else "teacher_name"
+    events = []
+
+    since = date.today() - timedelta(days=FEED_HISTORY_DAYS)
+    for lesson in crud.export_lessons(db, start_date=since, **owner):
+        start = availability.as_utc(lesson.start_time)
+        end = availability.as_utc(lesson.end_time) if lesson.end_time else start + timedelta(minutes=lesson.duration or 0)
+        events.append(ical.lesson_event(
+            f"lesson-{lesson.id}", start, end, f"Lesson: {getattr(lesson, other) or 'Unknown'}",
+            description=lesson.notes,
+        ))
+
+    # Weekly classes repeat from the Monday of the history window's first week
+    first_day = since - timedelta(days=since.weekday())
+    for slot in crud.get_schedule_slots(db, weekdays=list(range(7)), **owner):
+        events.append(ical.weekly_event(
+            f"schedule-{slot.id}", first_day, slot.weekday, slot.start_time, slot.duration,
+            f"Class: {getattr(slot, other) or 'Unassigned'}", settings.ACADEMY_TIMEZONE,
+        ))
+
+    return ical.calendar(f"{name} - Lessons", events, settings.ACADEMY_TIMEZONE, first_day=first_day)
+
+
+@router.get("/feeds/{token}.ics")
+def get_calendar_feed(token: str, request: Request, db: Session = Depends(get_db)):
+    """
+    iCalendar feed of a teacher's or student's lessons and weekly classes
+    The token in the URL is the credential, so calendar apps can subscribe
+    """
+    owner = _owner_for(db, token)
+    if owner is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Calendar not found")
+    kind, profile_id, name = owner
+
+    key = (kind, profile_id)
+    stamp = _feed_stamp(kind, profile_id)
+    memo = _feeds.get(key)
+    if not memo or memo[0] != stamp:
+        body = _render_feed(db, kind, profile_id, name)
+        etag = '"' + hashlib.blake2b(body.encode("utf-8"), digest_size=12).hexdigest() + '"'
+        # Unchanged content keeps its ETag, so clients still get 304 after a regeneration
+        if len(_feeds) >= _CACHE_SIZE:
+            _feeds.clear()
+        memo = _feeds[key] = (stamp, etag, body)
+
+    _, etag, body = memo
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    cached = versions.not_modified(request, etag)
+    if cached:
+        cached.headers.update(headers)
+        return cached
+    return Response(content=body, media_type="text/calendar; charset=utf-8", headers=headers)
@@ -1,27 +1,56 @@
 """
 Dashboard API endpoints for statistics and analytics
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func, extract, and_
 from datetime import date, datetime
+from typing import Dict, List, Optional
 from database import get_db
 from auth import get_current_admin_user, get_current_teacher_user, get_current_student_user
 import schemas
 import models
 import crud
+import versions
+import names
+import report_cache
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+MAX_REVENUE_MONTHS = 120
+
+# Per-teacher revenue rows of closed billing months: {month: (version stamp, rows)}
+_teacher_revenue: Dict[str, tuple] = {}
+
+
+def _month_range(start: str, end: str) -> List[str]:
+    """Billing months from start to end inclusive ("2024-01" format)"""
+    year, month = map(int, start.split("-"))
+    months = []
+    while f"{year}-{month:02d}" <= end and len(months) <= MAX_REVENUE_MONTHS:
+        months.append(f"{year}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
 
 @router.get("/stats", response_model=schemas.DashboardStats)
 def get_dashboard_stats(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_user),
 ):
     """
     Get dashboard statistics (Admin only)
     """
+    # Answer unchanged polls without running the queries below
+    etag = versions.etag_for(request, "students", "teachers", "lessons", "payments", daily=True)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     # Total students
     total_students = db.query(models.Student).count()
 
@@ -117,12 +146,20 @@ def get_dashboard_stats(
 
 @router.get("/teacher-hours", response_model=list[schemas.TeacherDailyHours])
 def get_teacher_daily_hours(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_user),
 ):
     """
     Get daily hours for all teachers (today) (Admin only)
     """
+    etag = versions.etag_for(request, "teachers", "lessons", daily=True)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     today = date.today()
     teachers = crud.get_teachers(db)
 
@@ -141,14 +178,114 @@ def get_teacher_daily_hours(
     return result
 
 
+@router.get("/revenue", response_model=list[schemas.RevenueMonth])
+def get_revenue(
+    request: Request,
+    response: Response,
+    start_month: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="Default: 11 months before end_month"),
+    end_month: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="Default: current month"),
+    by_teacher: bool = Query(False, description="Break totals down by assigned teacher"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Month-by-month paid, pending and collected-late revenue (Admin only)
+    Closed months are computed once and reused until a payment in that month changes
+    (totals through the persistent report cache)
+    """
+    today = date.today()
+    current_month = f"{today.year}-{today.month:02d}"
+    end_month = end_month or current_month
+    if start_month is None:
+        year, month = map(int, end_month.split("-"))
+        year, month = (year - 1, month + 1) if month < 12 else (year, 1)
+        start_month = f"{year}-{month:02d}"
+    months = _month_range(start_month, end_month)
+    if not months or len(months) > MAX_REVENUE_MONTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"start_month must not be after end_month, and at most {MAX_REVENUE_MONTHS} months",
+        )
+
+    etag = versions.etag_for(request, "payments", "students", "teachers", daily=True)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    if not by_teacher:
+        def compute(periods):
+            totals = {month: {"month": month, "paid": 0.0, "pending": 0.0, "collected_late": 0.0} for month in periods}
+            for row in crud.get_revenue_by_month(db, periods):
+                totals[row.month] = dict(row._mapping)
+            return totals
+
+        totals = report_cache.cached(db, "revenue", None, months, compute)
+        return [totals[month] for month in months]
+
+    # Teacher breakdowns follow current assignments rather than closed facts,
+    # so they are only memoized in process, stamped with students/teachers too
+    rows_by_month = {}
+    stamps = {}
+    for month in months:
+        if month >= current_month:
+            continue
+        stamps[month] = versions.period_stamp("payments", month) + versions.current("students", "teachers")
+        memo = _teacher_revenue.get(month)
+        if memo and memo[0] == stamps[month]:
+            rows_by_month[month] = memo[1]
+
+    missing = [month for month in months if month not in rows_by_month]
+    if missing:
+        fresh = {month: [] for month in missing}
+        for row in crud.get_revenue_by_month(db, missing, by_teacher=True):
+            fresh[row.month].append(dict(row._mapping))
+        for month, rows in fresh.items():
+            if month in stamps:
+                _teacher_revenue[month] = (stamps[month], rows)
+            rows_by_month[month] = rows
+
+    return [row for month in months for row in rows_by_month[month]]
+
+
+@router.get("/payroll", response_model=list[schemas.TeacherPayroll])
+def get_payroll(
+    request: Request,
+    response: Response,
+    month: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="Default: current month"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Monthly hours, lesson count and distinct students for every teacher (Admin only)
+    Also available as a CSV/NDJSON download at /api/exports/payroll
+    """
+    etag = versions.etag_for(request, "teachers", "lessons", daily=month is None)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    today = date.today()
+    return crud.get_teacher_payroll(db, month or f"{today.year}-{today.month:02d}").all()
+
+
 @router.get("/student-history", response_model=list[schemas.StudentLessonHistory])
 def get_student_lesson_history(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_user),
 ):
     """
     Get lesson history for all students (Admin only)
     """
+    etag = versions.etag_for(request, "students", "lessons")
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     students = crud.get_students(db)
 
     result = []
@@ -172,6 +309,8 @@ def get_student_lesson_history(
 
 @router.get("/teacher/me")
 def get_teacher_dashboard(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_teacher_user),
 ):
@@ -179,6 +318,12 @@ def get_teacher_dashboard(
     Get teacher's own dashboard data
     Returns students, lessons, and hours for the logged-in teacher
     """
+    etag = versions.etag_for(request, "teachers", "students", "lessons", scope=current_user.id, daily=True)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     from fastapi import HTTPException
 
     # Find teacher profile by user_id
@@ -209,11 +354,10 @@ def get_teacher_dashboard(
     lessons = crud.get_lessons(db, teacher_id=teacher_id, limit=100)
     lessons_list = []
     for lesson in lessons:
-        student = crud.get_student(db, lesson.student_id)
         lessons_list.append({
             "id": lesson.id,
             "student_id": lesson.student_id,
-            "student_name": student.name if student else "Unknown",
+            "student_name": names.student_name(db, lesson.student_id),
             "start_time": lesson.start_time.isoformat(),
             "end_time": lesson.end_time.isoformat() if lesson.end_time else None,
             "duration": lesson.duration,
@@ -244,6 +388,8 @@ def get_teacher_dashboard(
 
 @router.get("/student/me")
 def get_student_dashboard(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_student_user),
 ):
@@ -251,6 +397,12 @@ def get_student_dashboard(
     Get student's own dashboard data
     Returns lessons, payments, and statistics for the logged-in student
     """
+    etag = versions.etag_for(request, "students", "teachers", "lessons", "payments", scope=current_user.id)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     from fastapi import HTTPException
 
     # Find student profile by user_id
@@ -264,28 +416,25 @@ def get_student_dashboard(
 
     student_id = student_profile.id
 
-    # Get student's lessons
+    # Get student's recent lessons
     lessons = crud.get_lessons(db, student_id=student_id, limit=100)
     lessons_list = []
-    total_minutes = 0
     for lesson in lessons:
-        teacher = crud.get_teacher(db, lesson.teacher_id)
         lessons_list.append({
             "id": lesson.id,
             "teacher_id": lesson.teacher_id,
-            "teacher_name": teacher.name if teacher else "Unknown",
+            "teacher_name": names.teacher_name(db, lesson.teacher_id),
             "start_time": lesson.start_time.isoformat(),
             "end_time": lesson.end_time.isoformat() if lesson.end_time else None,
             "duration": lesson.duration,
         })
-        if lesson.duration:
-            total_minutes += lesson.duration
 
-    total_hours = total_minutes / 60.0
-    total_lessons = len(lessons)
+    # Lifetime statistics from the maintained counters
+    total_lessons = student_profile.lesson_count
+    total_hours = student_profile.total_minutes / 60.0
 
     # Calculate attendance rate (completed lessons / total lessons)
-    completed_lessons = sum(1 for lesson in lessons if lesson.end_time)
+    completed_lessons = student_profile.completed_lessons
     attendance_rate = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0
 
     # Get student's payments
@@ -304,12 +453,11 @@ def get_student_dashboard(
     assigned_teacher_name = None
     assigned_teacher_id = None
     teacher_user_id = None
-    if student_profile.assigned_teacher_id:
-        teacher = crud.get_teacher(db, student_profile.assigned_teacher_id)
-        if teacher:
-            assigned_teacher_name = teacher.name
-            assigned_teacher_id = teacher.id
-            teacher_user_id = teacher.user_id
+    teacher = names.teacher(db, student_profile.assigned_teacher_id)
+    if teacher:
+        assigned_teacher_name = teacher.name
+        assigned_teacher_id = student_profile.assigned_teacher_id
+        teacher_user_id = teacher.user_id
 
     return {
         "student_id": student_id,
@@ -317,6 +465,7 @@ def get_student_dashboard(
         "total_lessons": total_lessons,
         "total_hours": total_hours,
         "attendance_rate": attendance_rate,
+        "last_lesson_at": student_profile.last_lesson_at.isoformat() if student_profile.last_lesson_at else None,
         "fee_status": student_profile.fee_status.value,
         "assigned_teacher_name": assigned_teacher_name,
         "assigned_teacher_id": assigned_teacher_id,
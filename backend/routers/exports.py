@@ -0,0 +1,191 @@
+"""
+Streaming data export API endpoints (CSV / NDJSON)
+"""
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime
+from typing import Callable, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from database import SessionLocal, get_db
+from auth import get_current_admin_user, get_current_teacher_user
+import crud
+import models
+
+router = APIRouter(prefix="/api/exports", tags=["Exports"])
+
+# Rows buffered per chunk written to the response
+CHUNK_ROWS = 500
+
+EXPORT_FORMAT = Query("csv", pattern="^(csv|ndjson)$")
+
+
+def _plain(value):
+    """Convert a column value to a JSON/CSV friendly primitive"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _stream_rows(build_query: Callable[[Session], object], fmt: str):
+    """
+    Yield the export body in chunks.
+    Uses its own session because the request-scoped one is closed
+    before the response body is streamed.
+    """
+    db = SessionLocal()
+    try:
+        query = build_query(db)
+        columns = [column["name"] for column in query.column_descriptions]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+
+        pending = 0
+        for row in query:
+            values = [_plain(value) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, values))))
+                buffer.write("\n")
+            pending += 1
+            if pending >= CHUNK_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def _export_response(name: str, build_query: Callable[[Session], object], fmt: str):
+    """Wrap an export query in a streaming download response"""
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_rows(build_query, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@router.get("/lessons")
+def export_lessons(
+    format: str = EXPORT_FORMAT,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: models.User = Depends(get_current_teacher_user),
+):
+    """
+    Export lessons as CSV or NDJSON (Teacher/Admin)
+    Accepts the same filters as the lesson list endpoint
+    """
+    return _export_response(
+        "lessons",
+        lambda db: crud.export_lessons(
+            db,
+            student_id=student_id,
+            teacher_id=teacher_id,
+            start_date=start_date,
+            end_date=end_date,
+        ),
+        format,
+    )
+
+
+@router.get("/payments")
+def export_payments(
+    format: str = EXPORT_FORMAT,
+    student_id: Optional[int] = None,
+    status: Optional[str] = None,
+    month: Optional[str] = None,
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Export payments as CSV or NDJSON (Admin only)
+    Accepts the same filters as the payment list endpoint
+    """
+    return _export_response(
+        "payments",
+        lambda db: crud.export_payments(db, student_id=student_id, status=status, month=month),
+        format,
+    )
+
+
+@router.get("/payroll")
+def export_payroll(
+    format: str = EXPORT_FORMAT,
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Default: current month"),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Export the monthly teacher payroll as CSV or NDJSON (Admin only)
+    One row per teacher with hours, lesson count and distinct students
+    """
+    if month is None:
+        today = date.today()
+        month = f"{today.year}-{today.month:02d}"
+    return _export_response(f"payroll-{month}", lambda db: crud.get_teacher_payroll(db, month), format)
+
+
+@router.get("/messages")
+def export_messages(
+    format: str = EXPORT_FORMAT,
+    user_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Export chat messages as CSV or NDJSON (Admin only)
+    """
+    return _export_response(
+        "messages",
+        lambda db: crud.export_messages(
+            db,
+            user_id=user_id,
+            student_id=student_id,
+            teacher_id=teacher_id,
+            start_date=start_date,
+            end_date=end_date,
+        ),
+        format,
+    )
+
+
+@router.get("/achievements")
+def export_achievements(
+    format: str = EXPORT_FORMAT,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_teacher_user),
+):
+    """
+    Export achievements as CSV or NDJSON (Teacher/Admin)
+    Without filters a teacher gets the achievements they awarded, as in the list endpoint
+    """
+    if current_user.role == models.UserRole.TEACHER and not student_id and not teacher_id:
+        teacher = db.query(models.Teacher).filter(
+            models.Teacher.user_id == current_user.id
+        ).first()
+        if teacher:
+            teacher_id = teacher.id
+    return _export_response(
+        "achievements",
+        lambda db: crud.export_achievements(db, student_id=student_id, teacher_id=teacher_id),
+        format,
+    )
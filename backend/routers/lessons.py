@@ -1,7 +1,7 @@
 """
 Lesson tracking API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
@@ -10,10 +10,23 @@ from auth import get_current_teacher_user, get_current_user
 import schemas
 import crud
 import models
+from responses import rows_response
+import pagination
+import versions
+import names
+import availability
 
 router = APIRouter(prefix="/api/lessons", tags=["Lessons"])
 
 
+def _conflict(error: availability.LessonConflictError) -> HTTPException:
+    """409 for a lesson that would double-book its teacher or student"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": str(error), "conflicts": availability.conflict_rows(error.conflicts)},
+    )
+
+
 @router.post("/start", response_model=schemas.LessonResponse, status_code=status.HTTP_201_CREATED)
 def start_lesson(
     lesson_data: schemas.LessonStart,
@@ -33,7 +46,10 @@ def start_lesson(
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
 
-    return crud.start_lesson(db=db, student_id=lesson_data.student_id, teacher_id=lesson_data.teacher_id)
+    try:
+        return crud.start_lesson(db=db, student_id=lesson_data.student_id, teacher_id=lesson_data.teacher_id)
+    except availability.LessonConflictError as e:
+        raise _conflict(e)
 
 
 @router.post("/end", response_model=schemas.LessonResponse)
@@ -59,14 +75,21 @@ def create_lesson(
 ):
     """
     Create a lesson manually (Teacher/Admin)
+    Rejected with 409 if the teacher or student already has a lesson at that time
     """
-    return crud.create_lesson(db=db, lesson=lesson)
+    try:
+        return crud.create_lesson(db=db, lesson=lesson)
+    except availability.LessonConflictError as e:
+        raise _conflict(e)
 
 
 @router.get("/", response_model=List[schemas.LessonWithDetails])
 def list_lessons(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_total: bool = Query(False, description="Return X-Total-Count header"),
     student_id: Optional[int] = None,
     teacher_id: Optional[int] = None,
     start_date: Optional[date] = None,
@@ -76,26 +99,27 @@ def list_lessons(
 ):
     """
     Get list of lessons with optional filtering (Teacher/Admin)
+    Pass the X-Next-Cursor header back as `cursor` to fetch the next page
     """
-    lessons = crud.get_lessons(
-        db=db,
-        skip=skip,
-        limit=limit,
-        student_id=student_id,
-        teacher_id=teacher_id,
-        start_date=start_date,
-        end_date=end_date,
-    )
+    etag = versions.etag_for(request, "lessons", "students", "teachers")
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
 
-    # Add student and teacher names
-    result = []
-    for lesson in lessons:
-        lesson_dict = lesson.__dict__
-        lesson_dict["student_name"] = lesson.student.name if lesson.student else "Unknown"
-        lesson_dict["teacher_name"] = lesson.teacher.name if lesson.teacher else "Unknown"
-        result.append(lesson_dict)
-
-    return result
+    filters = dict(
+        student_id=student_id, teacher_id=teacher_id, start_date=start_date, end_date=end_date
+    )
+    rows = crud.get_lesson_rows(
+        db=db, skip=skip, limit=limit, after=pagination.decode_cursor(cursor), **filters
+    )
+    total = None
+    if include_total:
+        total = pagination.cached_count(
+            ("lessons", *filters.values()), lambda: crud.count_lessons(db, **filters)
+        )
+    response = rows_response(rows, schemas.LessonWithDetails, lambda item: names.add_names(db, item))
+    response.headers["ETag"] = etag
+    return pagination.set_page_headers(response, rows, limit, lambda row: row.date, total)
 
 
 @router.get("/{lesson_id}", response_model=schemas.LessonWithDetails)
@@ -112,7 +136,6 @@ def get_lesson(
         raise HTTPException(status_code=404, detail="Lesson not found")
 
     lesson_dict = db_lesson.__dict__
-    lesson_dict["student_name"] = db_lesson.student.name if db_lesson.student else "Unknown"
-    lesson_dict["teacher_name"] = db_lesson.teacher.name if db_lesson.teacher else "Unknown"
+    names.add_names(db, lesson_dict)
 
     return lesson_dict
@@ -1,7 +1,7 @@
 """
 Message/Chat API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from database import get_db
@@ -9,6 +9,7 @@ from auth import get_current_user
 import schemas
 import crud
 import models
+import versions
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
 
@@ -39,6 +40,8 @@ def send_message(
 
 @router.get("/conversations", response_model=List[schemas.ConversationSummary])
 def get_conversations(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
@@ -46,6 +49,12 @@ def get_conversations(
     Get all conversations for the current user
     Returns a list of users they've chatted with, along with last message and unread count
     """
+    etag = versions.etag_for(request, "messages", "users", "teachers", "students", scope=current_user.id)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     conversations = crud.get_conversations(db, current_user.id)
     return conversations
 
@@ -53,6 +62,8 @@ def get_conversations(
 @router.get("/with/{user_id}", response_model=List[schemas.MessageResponse])
 def get_messages_with_user(
     user_id: int,
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
@@ -62,6 +73,11 @@ def get_messages_with_user(
     Get all messages between current user and specified user
     Automatically marks messages from the other user as read
     """
+    etag = versions.etag_for(request, "messages", "users", scope=current_user.id)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+
     # Verify other user exists
     other_user = crud.get_user_by_id(db, user_id)
     if not other_user:
@@ -79,17 +95,28 @@ def get_messages_with_user(
     # Mark messages from other user as read
     crud.mark_messages_as_read(db, current_user.id, user_id)
 
+    # Tagged with the pre-read version, so the next poll picks up the read flags
+    response.headers["ETag"] = etag
+
     return messages
 
 
 @router.get("/unread-count")
 def get_unread_count(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Get total unread message count for current user
     """
+    etag = versions.etag_for(request, "messages", scope=current_user.id)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     count = crud.get_unread_count(db, current_user.id)
     return {"unread_count": count}
 
@@ -1,7 +1,7 @@
 """
 Payment management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
@@ -9,6 +9,10 @@ from auth import get_current_admin_user
 import schemas
 import crud
 import models
+from responses import rows_response
+import pagination
+import versions
+import names
 
 router = APIRouter(prefix="/api/payments", tags=["Payments"])
 
@@ -27,13 +31,74 @@ def create_payment(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    return crud.create_payment(db=db, payment=payment)
+    try:
+        return crud.create_payment(db=db, payment=payment)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.post("/billing-run", response_model=schemas.BillingRunResult)
+def billing_run(
+    request: schemas.BillingRunRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Create the month's payments for every active student (Admin only)
+    Safe to re-run: students already billed for the month are skipped
+    """
+    created = crud.run_billing(db, request.month, request.notes)
+    return {
+        "month": request.month,
+        "created": created,
+        "total_for_month": crud.count_payments(db, month=request.month),
+    }
+
+
+@router.post("/bulk-update", response_model=List[schemas.BulkPaymentResult])
+def bulk_update_payments(
+    request: schemas.BulkPaymentUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Update status/paid date of many payments at once (Admin only)
+    Select payments with payment_ids, or with month (optionally plus student_ids)
+    """
+    if request.payment_ids is None and request.month is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Provide payment_ids or month"
+        )
+    return crud.bulk_update_payments(
+        db,
+        status=request.status,
+        paid_date=request.paid_date,
+        payment_ids=request.payment_ids,
+        month=request.month,
+        student_ids=request.student_ids,
+    )
+
+
+@router.post("/reconcile")
+def reconcile_fee_status(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Recompute every student's fee status from their payments (Admin only)
+    """
+    changed = crud.reconcile_fee_status(db)
+    db.commit()
+    return {"changed": changed}
 
 
 @router.get("/", response_model=List[schemas.PaymentWithStudent])
 def list_payments(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_total: bool = Query(False, description="Return X-Total-Count header"),
     student_id: Optional[int] = None,
     status: Optional[str] = None,
     month: Optional[str] = None,
@@ -42,19 +107,25 @@ def list_payments(
 ):
     """
     Get list of payments with optional filtering (Admin only)
+    Pass the X-Next-Cursor header back as `cursor` to fetch the next page
     """
-    payments = crud.get_payments(
-        db=db, skip=skip, limit=limit, student_id=student_id, status=status, month=month
+    etag = versions.etag_for(request, "payments", "students")
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+
+    filters = dict(student_id=student_id, status=status, month=month)
+    rows = crud.get_payment_rows(
+        db=db, skip=skip, limit=limit, after=pagination.decode_cursor(cursor), **filters
     )
-
-    # Add student name
-    result = []
-    for payment in payments:
-        payment_dict = payment.__dict__
-        payment_dict["student_name"] = payment.student.name if payment.student else "Unknown"
-        result.append(payment_dict)
-
-    return result
+    total = None
+    if include_total:
+        total = pagination.cached_count(
+            ("payments", *filters.values()), lambda: crud.count_payments(db, **filters)
+        )
+    response = rows_response(rows, schemas.PaymentWithStudent, lambda item: names.add_names(db, item))
+    response.headers["ETag"] = etag
+    return pagination.set_page_headers(response, rows, limit, lambda row: row.month, total)
 
 
 @router.get("/{payment_id}", response_model=schemas.PaymentWithStudent)
@@ -71,7 +142,7 @@ def get_payment(
         raise HTTPException(status_code=404, detail="Payment not found")
 
     payment_dict = db_payment.__dict__
-    payment_dict["student_name"] = db_payment.student.name if db_payment.student else "Unknown"
+    payment_dict["student_name"] = names.student_name(db, db_payment.student_id)
 
     return payment_dict
 
@@ -86,7 +157,12 @@ def update_payment(
     """
     Update a payment (Admin only)
     """
-    db_payment = crud.update_payment(db, payment_id=payment_id, payment=payment)
+    if payment.student_id is not None and not crud.get_student(db, payment.student_id):
+        raise HTTPException(status_code=404, detail="Student not found")
+    try:
+        db_payment = crud.update_payment(db, payment_id=payment_id, payment=payment)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     if db_payment is None:
         raise HTTPException(status_code=404, detail="Payment not found")
     return db_payment
@@ -0,0 +1,148 @@
+"""
+Presence API endpoints: who is online or in a lesson room
+"""
+import asyncio
+import logging
+import uuid
+from typing import Dict, List, Optional, Set
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from auth import decode_access_token, get_token_payload
+from database import SessionLocal
+from presence import presence
+import crud
+import models
+import versions
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Presence"])
+
+# Most users one request or subscription may ask about
+MAX_USER_IDS = 500
+
+# {user id: (version stamp, user ids whose room it may see)}
+_visible: Dict[int, tuple] = {}
+_CACHE_SIZE = 4096
+
+
+def _parse_user_ids(value) -> List[int]:
+    if isinstance(value, str):
+        value = [part for part in value.split(",") if part.strip()]
+    try:
+        user_ids = list(dict.fromkeys(int(part) for part in value))
+    except (TypeError, ValueError):
+        raise ValueError("user_ids must be integers")
+    if len(user_ids) > MAX_USER_IDS:
+        raise ValueError(f"At most {MAX_USER_IDS} user_ids per request")
+    return user_ids
+
+
+def _lookup_visible(user_id: int, role: str) -> Set[int]:
+    db = SessionLocal()
+    try:
+        return {user_id} | crud.get_counterpart_user_ids(db, user_id, role)
+    finally:
+        db.close()
+
+
+async def _visible_for(payload: dict) -> Optional[Set[int]]:
+    """
+    Users whose lesson room the caller may see: everyone for admins, else
+    the caller and their assigned teacher/students. None means everyone
+    """
+    if payload.get("role") == models.UserRole.ADMIN.value:
+        return None
+    user_id = payload.get("uid")
+    if user_id is None:
+        return set()
+    stamp = versions.current("students", "teachers")
+    memo = _visible.get(user_id)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    visible = await asyncio.to_thread(_lookup_visible, user_id, payload.get("role"))
+    if len(_visible) >= _CACHE_SIZE:
+        _visible.clear()
+    _visible[user_id] = (stamp, visible)
+    return visible
+
+
+def _redact(row: dict, visible: Optional[Set[int]]) -> dict:
+    """Hide the lesson room of users the caller may not see; online status stays"""
+    if visible is not None and row["user_id"] not in visible:
+        row.update(lesson_id=None, room=None)
+    return row
+
+
+def _rows(user_ids: List[int], visible: Optional[Set[int]]) -> List[dict]:
+    return [
+        _redact({"user_id": user_id, **status}, visible)
+        for user_id, status in presence.snapshot(user_ids).items()
+    ]
+
+
+@router.get("/api/presence")
+async def get_presence(
+    user_ids: str = Query(..., description="Comma-separated user ids"),
+    payload: dict = Depends(get_token_payload),
+):
+    """
+    Online and in-lesson status for several users, answered from memory.
+    The lesson room is only shown for the caller and their assigned
+    teacher/students (all users for admins)
+    """
+    try:
+        user_ids = _parse_user_ids(user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _rows(user_ids, await _visible_for(payload))
+
+
+async def _push(websocket: WebSocket, subscription):
+    """Forward presence changes (or a full snapshot on resync) to the socket"""
+    while True:
+        event = await subscription.queue.get()
+        if event is None:
+            users = _rows(sorted(subscription.watched), subscription.visible)
+            await websocket.send_json({"type": "snapshot", "users": users})
+        else:
+            await websocket.send_json({"type": "presence", **_redact(dict(event), subscription.visible)})
+
+
+@router.websocket("/ws/presence")
+async def presence_socket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Push subscription for presence changes. The connection itself marks the
+    caller online. Send {"type": "watch", "user_ids": [...]} to choose the
+    users to follow; a snapshot of them is sent back, then changes as they happen.
+    """
+    payload = decode_access_token(token)
+    if payload is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    key = f"presence:{uuid.uuid4().hex}"
+    if payload.get("uid") is not None:
+        presence.set(key, payload["uid"])
+    subscription = presence.subscribe()
+    pusher = asyncio.create_task(_push(websocket, subscription))
+    try:
+        while True:
+            data = await websocket.receive_json()
+            if data.get("type") == "watch":
+                try:
+                    watched = set(_parse_user_ids(data.get("user_ids") or []))
+                except ValueError as e:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+                    break
+                subscription.visible = await _visible_for(payload)
+                subscription.watched = watched
+                subscription.resync()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Presence socket error: {e}")
+    finally:
+        pusher.cancel()
+        presence.unsubscribe(subscription)
+        presence.clear(key)
@@ -0,0 +1,124 @@
+"""
+Schedule calendar API endpoints
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date, datetime, time, timedelta
+from database import get_db
+from auth import get_current_teacher_user
+import schemas
+import crud
+import models
+import schedules
+import availability
+import versions
+
+router = APIRouter(prefix="/api/schedule", tags=["Schedule"])
+
+# Longest date range one calendar request may expand
+MAX_CALENDAR_DAYS = 62
+
+
+@router.get("/calendar", response_model=List[schemas.CalendarOccurrence])
+def get_calendar(
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = Query(None, description="Default: today"),
+    end_date: Optional[date] = Query(None, description="Default: start_date"),
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    from_time: Optional[time] = Query(None, description="Only classes starting at or after this time of day"),
+    to_time: Optional[time] = Query(None, description="Only classes starting at or before this time of day"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_teacher_user),
+):
+    """
+    Scheduled classes between two dates, expanded from weekly schedule slots (Teacher/Admin)
+    Without dates this is today's classes. Times are in the academy timezone
+    """
+    start_date = start_date or date.today()
+    end_date = end_date or start_date
+    if end_date < start_date or end_date - start_date >= timedelta(days=MAX_CALENDAR_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"end_date must be on or after start_date and within {MAX_CALENDAR_DAYS} days",
+        )
+
+    etag = versions.etag_for(request, "schedule_slots", "students", "teachers", daily=True)
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    slots = crud.get_schedule_slots(
+        db,
+        weekdays=schedules.weekdays_between(start_date, end_date),
+        teacher_id=teacher_id,
+        student_id=student_id,
+        from_time=from_time,
+        to_time=to_time,
+    )
+    occurrences = []
+    for wall_start, slot in schedules.expand(slots, start_date, end_date):
+        start = availability.wall_to_utc(wall_start)
+        occurrences.append({
+            "slot_id": slot.id,
+            "student_id": slot.student_id,
+            "student_name": slot.student_name,
+            "teacher_id": slot.teacher_id,
+            "teacher_name": slot.teacher_name,
+            "start": availability.to_local(start),
+            "end": availability.to_local(start + timedelta(minutes=slot.duration)),
+            "duration": slot.duration,
+        })
+    return occurrences
+
+
+@router.get("/free-slots", response_model=List[schemas.FreeSlot])
+def get_free_slots(
+    teacher_id: int,
+    week_start: Optional[date] = Query(None, description="Default: Monday of the current week"),
+    duration: int = Query(30, ge=5, le=480, description="Minimum opening in minutes"),
+    day_start: time = Query(time(9, 0), description="Start of working hours"),
+    day_end: time = Query(time(21, 0), description="End of working hours"),
+    student_id: Optional[int] = Query(None, description="Only openings when this student is free too"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_teacher_user),
+):
+    """
+    Openings in a teacher's week, around lessons and scheduled classes (Teacher/Admin)
+    Times are in the academy timezone
+    """
+    if day_end <= day_start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="day_end must be after day_start")
+    if week_start is None:
+        today = availability.to_local(datetime.utcnow()).date()
+        week_start = today - timedelta(days=today.weekday())
+
+    openings = availability.free_slots(db, teacher_id, week_start, duration, day_start, day_end, student_id)
+    return [
+        {"start": start, "end": end, "minutes": int((end - start).total_seconds() // 60)}
+        for start, end in openings
+    ]
+
+
+@router.get("/conflicts", response_model=List[schemas.LessonConflict])
+def get_conflicts(
+    start: datetime,
+    end: datetime,
+    teacher_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_teacher_user),
+):
+    """
+    Lessons and scheduled classes that a lesson for this teacher/student would overlap (Teacher/Admin)
+    """
+    if not teacher_id and not student_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass teacher_id and/or student_id")
+    if end <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must be after start")
+    return availability.conflict_rows(
+        availability.find_conflicts(db, start, end, teacher_id, student_id, include_schedule=True)
+    )
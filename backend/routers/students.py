@@ -1,7 +1,7 @@
 """
 Student management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
@@ -9,6 +9,10 @@ from auth import get_current_admin_user
 import schemas
 import crud
 import models
+from responses import rows_response
+import pagination
+import versions
+import names
 
 router = APIRouter(prefix="/api/students", tags=["Students"])
 
@@ -27,8 +31,11 @@ def create_student(
 
 @router.get("/", response_model=List[schemas.StudentWithTeacher])
 def list_students(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_total: bool = Query(False, description="Return X-Total-Count header"),
     teacher_id: Optional[int] = None,
     fee_status: Optional[str] = None,
     db: Session = Depends(get_db),
@@ -36,22 +43,25 @@ def list_students(
 ):
     """
     Get list of students with optional filtering (Admin only)
+    Pass the X-Next-Cursor header back as `cursor` to fetch the next page
     """
-    students = crud.get_students(
-        db=db, skip=skip, limit=limit, teacher_id=teacher_id, fee_status=fee_status
-    )
-
-    # Add teacher name to response
-    result = []
-    for student in students:
-        student_dict = student.__dict__
-        if student.teacher:
-            student_dict["teacher_name"] = student.teacher.name
-        else:
-            student_dict["teacher_name"] = None
-        result.append(student_dict)
+    etag = versions.etag_for(request, "students", "teachers")
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
 
-    return result
+    filters = dict(teacher_id=teacher_id, fee_status=fee_status)
+    rows = crud.get_student_rows(
+        db=db, skip=skip, limit=limit, after=pagination.decode_cursor(cursor), **filters
+    )
+    total = None
+    if include_total:
+        total = pagination.cached_count(
+            ("students", *filters.values()), lambda: crud.count_students(db, **filters)
+        )
+    response = rows_response(rows, schemas.StudentWithTeacher)
+    response.headers["ETag"] = etag
+    return pagination.set_page_headers(response, rows, limit, lambda row: None, total)
 
 
 @router.get("/{student_id}", response_model=schemas.StudentWithTeacher)
@@ -68,10 +78,7 @@ def get_student(
         raise HTTPException(status_code=404, detail="Student not found")
 
     student_dict = db_student.__dict__
-    if db_student.teacher:
-        student_dict["teacher_name"] = db_student.teacher.name
-    else:
-        student_dict["teacher_name"] = None
+    student_dict["teacher_name"] = names.teacher_name(db, db_student.assigned_teacher_id, default=None)
 
     return student_dict
 
@@ -86,7 +93,10 @@ def update_student(
     """
     Update a student (Admin only)
     """
-    db_student = crud.update_student(db, student_id=student_id, student=student)
+    try:
+        db_student = crud.update_student(db, student_id=student_id, student=student)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     if db_student is None:
         raise HTTPException(status_code=404, detail="Student not found")
     return db_student
@@ -1,7 +1,7 @@
 """
 Teacher management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
@@ -10,6 +10,8 @@ from auth import get_current_admin_user
 import schemas
 import crud
 import models
+import pagination
+import versions
 
 router = APIRouter(prefix="/api/teachers", tags=["Teachers"])
 
@@ -28,16 +30,36 @@ def create_teacher(
 
 @router.get("/", response_model=List[schemas.TeacherResponse])
 def list_teachers(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_total: bool = Query(False, description="Return X-Total-Count header"),
     status: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_user),
 ):
     """
     Get list of teachers with optional filtering (Admin only)
+    Pass the X-Next-Cursor header back as `cursor` to fetch the next page
     """
-    return crud.get_teachers(db=db, skip=skip, limit=limit, status=status)
+    etag = versions.etag_for(request, "teachers")
+    cached = versions.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    teachers = crud.get_teachers(
+        db=db, skip=skip, limit=limit, status=status, after=pagination.decode_cursor(cursor)
+    )
+    total = None
+    if include_total:
+        total = pagination.cached_count(
+            ("teachers", status), lambda: crud.count_teachers(db, status=status)
+        )
+    pagination.set_page_headers(response, teachers, limit, lambda teacher: None, total)
+    return teachers
 
 
 @router.get("/{teacher_id}", response_model=schemas.TeacherResponse)
@@ -68,8 +90,8 @@ def get_teacher_stats(
     if db_teacher is None:
         raise HTTPException(status_code=404, detail="Teacher not found")
 
-    # Get student count
-    total_students = crud.count_students(db, teacher_id=teacher_id)
+    # Get student count (maintained counter)
+    total_students = db_teacher.active_students
 
     # Get daily hours (today)
     today = date.today()
@@ -83,6 +105,7 @@ def get_teacher_stats(
         "total_students": total_students,
         "daily_hours": daily_hours,
         "monthly_hours": monthly_hours,
+        "total_hours": db_teacher.total_minutes / 60.0,
     }
 
 
@@ -0,0 +1,133 @@
+"""
+Parsing and expansion of weekly lesson schedules
+
+Student schedules are entered as text such as "Mon-Wed-Fri 3:00 PM" or
+"Tue 4pm, Thu 5:30 PM 45 min". parse_schedule() turns the text into weekly
+slots stored in the schedule_slots table; expand() turns stored slots into
+dated occurrences for a calendar range.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+# Minutes, same as the lesson default
+DEFAULT_DURATION = 30
+
+_DAY_WORDS = {
+    "mon": (0,), "monday": (0,),
+    "tue": (1,), "tues": (1,), "tuesday": (1,),
+    "wed": (2,), "weds": (2,), "wednesday": (2,),
+    "thu": (3,), "thur": (3,), "thurs": (3,), "thursday": (3,),
+    "fri": (4,), "friday": (4,),
+    "sat": (5,), "saturday": (5,),
+    "sun": (6,), "sunday": (6,),
+    "daily": tuple(range(7)), "weekdays": tuple(range(5)), "weekends": (5, 6), "weekend": (5, 6),
+}
+_FILLER_WORDS = {"and", "at", "on", "every", "each", "from", "for"}
+
+_TOKEN = re.compile(
+    r"""
+    (?P<minutes>\d{1,3})\s*(?:minutes|mins|min|m)\b
+    | (?P<hours>\d(?:\.\d+)?)\s*(?:hours|hour|hrs|hr|h)\b
+    | (?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>[ap])\.?m\b\.?
+    | (?P<hour24>\d{1,2}):(?P<minute24>\d{2})
+    | (?P<word>[a-z]+)
+    | (?P<separator>[\s,;/&+.\-]+)
+    """,
+    re.VERBOSE,
+)
+
+# The group that tells which alternative of _TOKEN matched
+_KINDS = ("minutes", "hours", "hour", "hour24", "word", "separator")
+
+
+class ScheduleError(ValueError):
+    """Raised for schedule text that cannot be parsed"""
+
+
+class Slot(NamedTuple):
+    weekday: int  # 0 = Monday
+    start_time: time
+    duration: int  # minutes
+
+
+def _clock(hour: int, minute: int, meridiem: str = None) -> time:
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ScheduleError(f"Invalid hour {hour} {meridiem.upper()}M")
+        hour = hour % 12 + (12 if meridiem == "p" else 0)
+    if hour > 23 or minute > 59:
+        raise ScheduleError(f"Invalid time {hour}:{minute:02d}")
+    return time(hour, minute)
+
+
+def parse_schedule(text: str) -> List[Slot]:
+    """
+    Parse schedule text into weekly slots. Days listed before a time share
+    it ("Mon-Wed 3pm"); a duration such as "45 min" or "1.5h" applies to the
+    time just before it. Returns an empty list for blank text.
+    """
+    days: List[int] = []  # days waiting for a time
+    group: List[int] = []  # indexes into slots of the latest time
+    slots: List[Slot] = []
+    text = (text or "").strip().lower()
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ScheduleError(f"Unexpected text in schedule: {text[position:position + 10]!r}")
+        position = match.end()
+        kind = next(name for name in _KINDS if match.group(name) is not None)
+        if kind == "separator":
+            continue
+        if kind == "word":
+            word = match.group("word")
+            if word in _FILLER_WORDS:
+                continue
+            if word not in _DAY_WORDS:
+                raise ScheduleError(f"Unknown day {word!r} in schedule")
+            days.extend(_DAY_WORDS[word])
+        elif kind in ("minutes", "hours"):
+            if not group:
+                raise ScheduleError("A duration must follow a time")
+            duration = int(match.group("minutes")) if kind == "minutes" else round(float(match.group("hours")) * 60)
+            if not 0 < duration <= 24 * 60:
+                raise ScheduleError(f"Invalid duration of {duration} minutes")
+            for index in group:
+                slots[index] = slots[index]._replace(duration=duration)
+        else:
+            if kind == "hour24":
+                start = _clock(int(match.group("hour24")), int(match.group("minute24")))
+            else:
+                start = _clock(int(match.group("hour")), int(match.group("minute") or 0), match.group("meridiem"))
+            # "Mon 3pm 5pm": a second time reuses the previous days
+            weekdays = days or [slots[index].weekday for index in group]
+            if not weekdays:
+                raise ScheduleError("A time must follow one or more days")
+            group = list(range(len(slots), len(slots) + len(weekdays)))
+            slots.extend(Slot(weekday, start, DEFAULT_DURATION) for weekday in weekdays)
+            days = []
+    if days:
+        raise ScheduleError("Schedule lists days without a time")
+    return sorted(set(slots))
+
+
+def expand(slots: Iterable, start_date: date, end_date: date) -> Iterator[Tuple[datetime, object]]:
+    """
+    Yield (start datetime, slot) for every occurrence of weekly slots between
+    two dates inclusive, in date order. Slots need weekday and start_time.
+    """
+    by_weekday: Dict[int, list] = {}
+    for slot in slots:
+        by_weekday.setdefault(slot.weekday, []).append(slot)
+    day = start_date
+    while day <= end_date:
+        for slot in by_weekday.get(day.weekday(), ()):
+            yield datetime.combine(day, slot.start_time), slot
+        day += timedelta(days=1)
+
+
+def weekdays_between(start_date: date, end_date: date) -> List[int]:
+    """Weekdays (0 = Monday) that occur between two dates inclusive"""
+    days = min((end_date - start_date).days + 1, 7)
+    return sorted({(start_date + timedelta(days=offset)).weekday() for offset in range(max(days, 0))})
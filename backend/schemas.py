@@ -1,10 +1,11 @@
 """
 Pydantic schemas for request/response validation
 """
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 from models import UserRole, FeeStatus, TeacherStatus
+from schedules import parse_schedule
 
 
 # ============= Auth Schemas =============
@@ -84,6 +85,11 @@ class TeacherWithStats(TeacherResponse):
     total_students: int
     daily_hours: float
     monthly_hours: float
+    # Lifetime
+    lesson_count: int = 0
+    completed_lessons: int = 0
+    total_hours: float = 0.0
+    last_lesson_at: Optional[datetime] = None
 
 
 # ============= Student Schemas =============
@@ -98,10 +104,19 @@ class StudentBase(BaseModel):
     notes: Optional[str] = None
 
 
+def _check_schedule(value: Optional[str]) -> Optional[str]:
+    """Reject schedule text the slot parser cannot read"""
+    if value:
+        parse_schedule(value)
+    return value
+
+
 class StudentCreate(StudentBase):
     username: str  # Login username for student
     password: str  # Login password for student
 
+    _schedule = field_validator("schedule")(_check_schedule)
+
 
 class StudentUpdate(BaseModel):
     name: Optional[str] = None
@@ -112,6 +127,7 @@ class StudentUpdate(BaseModel):
     fee_amount: Optional[float] = None
     fee_status: Optional[FeeStatus] = None
     notes: Optional[str] = None
+    # Schedule text is checked by crud.update_student, and only when it changes
 
 
 class StudentResponse(StudentBase):
@@ -164,6 +180,7 @@ class LessonResponse(BaseModel):
     end_time: Optional[datetime]
     duration: int
     notes: Optional[str]
+    auto_closed: bool = False
     created_at: datetime
 
     class Config:
@@ -175,6 +192,38 @@ class LessonWithDetails(LessonResponse):
     teacher_name: str
 
 
+# ============= Schedule Schemas =============
+class CalendarOccurrence(BaseModel):
+    slot_id: int
+    student_id: int
+    student_name: str
+    teacher_id: Optional[int] = None
+    teacher_name: Optional[str] = None
+    start: datetime
+    end: datetime
+    duration: int  # minutes
+
+
+class FreeSlot(BaseModel):
+    start: datetime
+    end: datetime
+    minutes: int
+
+
+class LessonConflict(BaseModel):
+    kind: str  # "lesson" or "schedule"
+    id: int  # Lesson or schedule slot id
+    teacher_id: Optional[int] = None
+    student_id: int
+    start: datetime
+    end: datetime
+
+
+class CalendarFeed(BaseModel):
+    token: str
+    url: str  # iCalendar subscription URL
+
+
 # ============= Payment Schemas =============
 class PaymentBase(BaseModel):
     student_id: int
@@ -189,6 +238,8 @@ class PaymentCreate(PaymentBase):
 
 
 class PaymentUpdate(BaseModel):
+    student_id: Optional[int] = None
+    month: Optional[str] = None
     amount: Optional[float] = None
     status: Optional[FeeStatus] = None
     paid_date: Optional[datetime] = None
@@ -209,6 +260,31 @@ class PaymentWithStudent(PaymentResponse):
     student_name: str
 
 
+class BulkPaymentUpdate(BaseModel):
+    # Select payments by id, or by month (optionally limited to some students)
+    payment_ids: Optional[List[int]] = Field(None, max_length=5000)
+    month: Optional[str] = Field(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+    student_ids: Optional[List[int]] = Field(None, max_length=5000)
+    status: FeeStatus = FeeStatus.PAID
+    paid_date: Optional[datetime] = None
+
+
+class BulkPaymentResult(BaseModel):
+    id: int
+    result: str  # "updated", "unchanged" or "not_found"
+
+
+class BillingRunRequest(BaseModel):
+    month: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")  # Format: "2024-01"
+    notes: Optional[str] = None
+
+
+class BillingRunResult(BaseModel):
+    month: str
+    created: int
+    total_for_month: int
+
+
 # ============= Achievement Schemas =============
 class AchievementBase(BaseModel):
     title: str
@@ -295,6 +371,25 @@ class DashboardStats(BaseModel):
     pending_revenue_this_month: float
 
 
+class RevenueMonth(BaseModel):
+    month: str
+    paid: float
+    pending: float
+    collected_late: float
+    teacher_id: Optional[int] = None
+    teacher_name: Optional[str] = None
+
+
+class TeacherPayroll(BaseModel):
+    teacher_id: int
+    teacher_name: str
+    status: TeacherStatus
+    month: str
+    hours: float
+    lesson_count: int
+    student_count: int
+
+
 class TeacherDailyHours(BaseModel):
     teacher_id: int
     teacher_name: str
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from database import SessionLocal, engine, Base
 from auth import get_password_hash
 import models
+import crud
 
 def create_tables():
     """Create all database tables"""
@@ -113,7 +114,11 @@ def create_sample_data():
             fee_status=models.FeeStatus.UNPAID
         )
 
+        for student in (student1, student2, student3):
+            crud.sync_schedule_slots(student)
         db.add_all([student1, student2, student3])
+        db.flush()
+        crud.rebuild_stat_counters(db)
         db.commit()
 
         print("[OK] Sample data created:")
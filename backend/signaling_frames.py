@@ -0,0 +1,179 @@
+"""
+Compact binary frames for batched ICE candidates
+
+Clients that negotiate the "binary" feature at register may send and
+receive ICE candidate batches as binary WebSocket frames. All integers are
+big-endian:
+
+    u8   frame kind (1 = ICE candidate batch)
+    u8   peer id length, then the peer id (UTF-8): the target when sent by
+         a client, the sender when delivered by the server
+    u16  candidate count, then for each candidate:
+         u16 length + candidate line
+         u8  length + sdpMid
+         u16 sdpMLineIndex (0xFFFF when null)
+         u8  length + usernameFragment
+
+The server only reads the header and swaps the peer id, so a batch passes
+between two binary clients without its candidates being decoded.
+"""
+import struct
+from typing import Iterable, List, Tuple, Union
+
+ICE_BATCH = 1
+NO_INDEX = 0xFFFF
+MAX_CANDIDATES = 0xFFFF
+
+_HEADER = struct.Struct(">BB")
+_COUNT = struct.Struct(">H")
+
+# A batch is either decoded candidate dicts or an encoded body (count + entries)
+Candidates = Union[List[dict], bytes]
+
+
+class FrameError(ValueError):
+    """Raised for malformed binary frames"""
+
+
+def _text(value, limit: int) -> bytes:
+    data = (value or "").encode("utf-8")
+    if len(data) > limit:
+        raise FrameError("Field too long for a binary frame")
+    return data
+
+
+def _optional_text(candidate: dict, field: str, limit: int):
+    value = candidate.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise FrameError(f"{field} must be a string")
+    _text(value, limit)
+    return value
+
+
+def normalize_candidate(candidate) -> dict:
+    """
+    Check a candidate dict (RTCIceCandidateInit) from a JSON client and return
+    it with only the known fields, so it can always be encoded as a binary frame
+    """
+    if candidate is None:
+        # End-of-candidates marker
+        candidate = {}
+    if not isinstance(candidate, dict):
+        raise FrameError("Candidate must be an object")
+    index = candidate.get("sdpMLineIndex")
+    if index is not None and (
+        isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < NO_INDEX
+    ):
+        raise FrameError("sdpMLineIndex must be an integer from 0 to 65534")
+    normalized = {
+        "candidate": _optional_text(candidate, "candidate", 0xFFFF) or "",
+        "sdpMid": _optional_text(candidate, "sdpMid", 0xFF),
+        "sdpMLineIndex": index,
+    }
+    ufrag = _optional_text(candidate, "usernameFragment", 0xFF)
+    if ufrag:
+        normalized["usernameFragment"] = ufrag
+    return normalized
+
+
+def normalize_candidates(candidates) -> List[dict]:
+    """normalize_candidate() over a JSON list of candidates"""
+    if not isinstance(candidates, list):
+        raise FrameError("candidates must be a list")
+    if len(candidates) > MAX_CANDIDATES:
+        raise FrameError("Too many candidates in one batch")
+    return [normalize_candidate(candidate) for candidate in candidates]
+
+
+def encode_body(candidates: Iterable[dict]) -> bytes:
+    """Encode candidate dicts (RTCIceCandidateInit) as a batch body"""
+    out = []
+    count = 0
+    for candidate in candidates:
+        candidate = normalize_candidate(candidate)
+        line = _text(candidate.get("candidate"), 0xFFFF)
+        mid = _text(candidate.get("sdpMid"), 0xFF)
+        ufrag = _text(candidate.get("usernameFragment"), 0xFF)
+        index = candidate.get("sdpMLineIndex")
+        out.append(struct.pack(">H", len(line)) + line)
+        out.append(bytes((len(mid),)) + mid)
+        out.append(struct.pack(">H", NO_INDEX if index is None else index))
+        out.append(bytes((len(ufrag),)) + ufrag)
+        count += 1
+    if count > MAX_CANDIDATES:
+        raise FrameError("Too many candidates in one batch")
+    return _COUNT.pack(count) + b"".join(out)
+
+
+def decode_body(body: bytes) -> List[dict]:
+    """Decode a batch body back into candidate dicts"""
+    try:
+        (count,) = _COUNT.unpack_from(body, 0)
+        offset = _COUNT.size
+        candidates = []
+        for _ in range(count):
+            (length,) = struct.unpack_from(">H", body, offset)
+            offset += 2
+            line = body[offset:offset + length].decode("utf-8")
+            offset += length
+            length = body[offset]
+            mid = body[offset + 1:offset + 1 + length].decode("utf-8")
+            offset += 1 + length
+            (index,) = struct.unpack_from(">H", body, offset)
+            offset += 2
+            length = body[offset]
+            ufrag = body[offset + 1:offset + 1 + length].decode("utf-8")
+            offset += 1 + length
+            candidate = {
+                "candidate": line,
+                "sdpMid": mid or None,
+                "sdpMLineIndex": None if index == NO_INDEX else index,
+            }
+            if ufrag:
+                candidate["usernameFragment"] = ufrag
+            candidates.append(candidate)
+    except (struct.error, IndexError, UnicodeDecodeError):
+        raise FrameError("Truncated or malformed candidate batch")
+    if offset != len(body):
+        raise FrameError("Trailing bytes after candidate batch")
+    return candidates
+
+
+def split_frame(frame: bytes) -> Tuple[int, str, bytes]:
+    """Read a frame header: (kind, peer id, body)"""
+    try:
+        kind, length = _HEADER.unpack_from(frame, 0)
+        start = _HEADER.size
+        peer = frame[start:start + length].decode("utf-8")
+    except (struct.error, UnicodeDecodeError):
+        raise FrameError("Malformed frame header")
+    body = frame[start + length:]
+    if len(body) < _COUNT.size:
+        raise FrameError("Missing candidate count")
+    return kind, peer, body
+
+
+def encode_frame(peer: str, parts: Iterable[Candidates]) -> bytes:
+    """
+    Build one ICE batch frame addressed to/from peer, merging several parts
+    (decoded candidate lists or already encoded bodies).
+    """
+    bodies = [part if isinstance(part, bytes) else encode_body(part) for part in parts]
+    if len(bodies) == 1:
+        body = bodies[0]
+    else:
+        count = sum(_COUNT.unpack_from(b, 0)[0] for b in bodies)
+        if count > MAX_CANDIDATES:
+            raise FrameError("Too many candidates in one batch")
+        body = _COUNT.pack(count) + b"".join(b[_COUNT.size:] for b in bodies)
+    return _HEADER.pack(ICE_BATCH, len(_text(peer, 0xFF))) + peer.encode("utf-8") + body
+
+
+def decode_parts(parts: Iterable[Candidates]) -> List[dict]:
+    """Flatten parts into a single list of candidate dicts"""
+    candidates = []
+    for part in parts:
+        candidates.extend(decode_body(part) if isinstance(part, bytes) else part)
+    return candidates
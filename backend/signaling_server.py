@@ -5,9 +5,21 @@ This server handles WebRTC signaling between teachers and students
 import asyncio
 import json
 import logging
-from typing import Dict, Set
-from fastapi import WebSocket, WebSocketDisconnect
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import Depends, WebSocket, WebSocketDisconnect
 from fastapi.routing import APIRouter
+from config import settings
+from auth import decode_access_token, get_current_admin_user
+from backplane import create_backplane
+from presence import presence
+from lesson_tracker import tracker
+import models
+from signaling_frames import (
+    ICE_BATCH, Candidates, FrameError, decode_body, decode_parts, encode_frame, normalize_candidate,
+    normalize_candidates, split_frame,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,43 +27,387 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Store active connections: {client_id: websocket}
-active_connections: Dict[str, WebSocket] = {}
-# Store active rooms/lessons: {lesson_id: {student_id, teacher_id}}
-active_rooms: Dict[int, Set[str]] = {}
+# Room used by clients that register without a lesson id
+DEFAULT_ROOM = "lobby"
+# Backplane channel shared by all signaling processes
+BACKPLANE_CHANNEL = "signaling"
+# Optional protocol features a client may ask for at register:
+# "batch" coalesces relayed ICE candidates into "ice-candidates" messages,
+# "binary" sends those batches as compact binary frames (implies "batch")
+FEATURES = ("batch", "binary")
+
+
+class ClientConnection:
+    """
+    A registered socket with a bounded outbound queue drained by its own
+    writer task, so a slow client never delays sends to anyone else.
+    """
+
+    def __init__(self, client_id: str, websocket: WebSocket, on_drop):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SIGNALING_SEND_QUEUE_SIZE)
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self.user_id = None
+        self.batch = False
+        self.binary = False
+        # ICE candidates waiting for the batch window, keyed by sender
+        self._pending: Dict[str, List[Candidates]] = {}
+        self._flush_handle: asyncio.TimerHandle = None
+        self._on_drop = on_drop
+        self._writer = asyncio.create_task(self._drain())
+
+    def negotiate(self, requested) -> List[str]:
+        """Enable the requested protocol features and return those accepted"""
+        requested = set(requested or ()) & set(FEATURES)
+        self.binary = "binary" in requested
+        self.batch = self.binary or "batch" in requested
+        return [feature for feature in FEATURES if feature in requested or (feature == "batch" and self.batch)]
+
+    def send(self, message: dict) -> bool:
+        """Queue a message; ICE candidates are held for the batch window when negotiated"""
+        message_type = message.get("type")
+        if message_type == "ice-candidates":
+            return self.send_candidates(message.get("from"), message.get("candidates") or [])
+        if message_type == "ice-candidate" and self.batch:
+            return self.send_candidates(message.get("from"), [message.get("candidate")])
+        # Anything else from a peer must not overtake its earlier candidates
+        self.flush_candidates()
+        return self._enqueue(message)
+
+    def send_candidates(self, sender: str, candidates: Candidates) -> bool:
+        """Deliver ICE candidates from sender, given as dicts or an encoded batch body"""
+        if not self.batch:
+            if isinstance(candidates, bytes):
+                candidates = decode_body(candidates)
+            return all([
+                self._enqueue({"type": "ice-candidate", "candidate": candidate, "from": sender})
+                for candidate in candidates
+            ])
+        if self.closed:
+            return False
+        self._pending.setdefault(sender, []).append(candidates)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                settings.SIGNALING_CANDIDATE_BATCH_WINDOW, self.flush_candidates
+            )
+        return True
+
+    def flush_candidates(self):
+        """Send held candidates as one frame per sender"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for sender, parts in pending.items():
+            # One bad batch must not lose the other senders' candidates
+            try:
+                if self.binary:
+                    message = encode_frame(sender, parts)
+                else:
+                    message = {"type": "ice-candidates", "from": sender, "candidates": decode_parts(parts)}
+            except FrameError as e:
+                logger.warning(f"Dropping candidates from {sender} to {self.client_id}: {e}")
+                continue
+            self._enqueue(message)
+
+    def _enqueue(self, message) -> bool:
+        """Queue a message (dict, or bytes for a binary frame) without waiting"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.drop("send queue overflow")
+            return False
+
+    async def _drain(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if isinstance(message, bytes):
+                    send = self.websocket.send_bytes(message)
+                else:
+                    send = self.websocket.send_json(message)
+                await asyncio.wait_for(send, settings.SIGNALING_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.drop("send timeout")
+        except Exception as e:
+            self.drop(f"send error: {e}")
+
+    def close(self):
+        """Stop the writer task; queued messages are discarded"""
+        self.closed = True
+        self._pending.clear()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    def drop(self, reason: str):
+        """Give up on a client that cannot keep up"""
+        if self.closed:
+            return
+        logger.warning(f"Dropping client {self.client_id}: {reason}")
+        self.close()
+        asyncio.create_task(self._on_drop(self))
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+        self.active_connections: Dict[str, ClientConnection] = {}
+        # Room index: {room_id: {client_id}} and reverse {client_id: room_id}
+        self.rooms: Dict[str, Set[str]] = {}
+        self.client_rooms: Dict[str, str] = {}
+        self.stats = {"dropped": 0, "reaped": 0}
+        self._reaper: asyncio.Task = None
 
-    async def connect(self, websocket: WebSocket, client_id: str):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-        logger.info(f"✅ Client connected: {client_id}")
+        # Clients held by other processes, learned over the backplane:
+        # {client_id: (node_id, room_id, user_id)}, {room_id: {client_id}}, {node_id: last_seen}
+        self.node_id = uuid.uuid4().hex[:12]
+        self.backplane = create_backplane(settings.SIGNALING_BACKPLANE_URL)
+        self.remote_clients: Dict[str, Tuple[str, str, Optional[int]]] = {}
+        self.remote_rooms: Dict[str, Set[str]] = {}
+        self.remote_nodes: Dict[str, float] = {}
+        self._backplane_started = False
 
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            logger.info(f"👋 Client disconnected: {client_id}")
+    def _ensure_reaper(self):
+        if not self._backplane_started:
+            self._backplane_started = True
+            asyncio.create_task(self._start_backplane())
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
 
-    async def send_personal_message(self, message: dict, client_id: str):
-        if client_id in self.active_connections:
-            try:
-                await self.active_connections[client_id].send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to {client_id}: {e}")
+    async def _start_backplane(self):
+        await self.backplane.start(BACKPLANE_CHANNEL, self._on_backplane)
+        # Ask the other processes to replay their presence
+        self._publish({"kind": "hello"})
+
+    def _publish(self, message: dict):
+        message["node"] = self.node_id
+        asyncio.create_task(self.backplane.publish(BACKPLANE_CHANNEL, message))
+
+    def _on_backplane(self, message: dict):
+        """Apply presence and relay events published by other processes"""
+        node = message.get("node")
+        if node == self.node_id:
+            return
+        self.remote_nodes[node] = time.monotonic()
+        kind = message.get("kind")
+
+        if kind == "join":
+            client_id, room_id = message["client"], message["room"]
+            known = self.remote_clients.get(client_id, ())[:2] == (node, room_id)
+            self._forget_remote(client_id)
+            self.remote_clients[client_id] = (node, room_id, message.get("user"))
+            self.remote_rooms.setdefault(room_id, set()).add(client_id)
+            self._room_changed(room_id)
+            if not known:
+                self.broadcast_to_room(room_id, {"type": "user-joined", "clientId": client_id})
+
+        elif kind == "leave":
+            room_id = self._forget_remote(message["client"])
+            if room_id:
+                self.broadcast_to_room(room_id, {"type": "user-left", "clientId": message["client"]})
 
-    async def broadcast(self, message: dict, exclude_client: str = None):
-        for client_id, connection in self.active_connections.items():
+        elif kind == "relay" and message.get("to") == self.node_id:
+            self.send_personal_message(message["message"], message["target"])
+
+        elif kind == "hello":
+            for client_id, room_id in self.client_rooms.items():
+                self._publish_join(client_id, room_id)
+
+    def _forget_remote(self, client_id: str):
+        entry = self.remote_clients.pop(client_id, None)
+        if entry is None:
+            return None
+        room_id = entry[1]
+        members = self.remote_rooms.get(room_id)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.remote_rooms[room_id]
+            self._room_changed(room_id)
+        return room_id
+
+    def _expire_nodes(self, now: float):
+        """Forget clients of processes that stopped publishing heartbeats"""
+        for node, last_seen in list(self.remote_nodes.items()):
+            if now - last_seen > settings.SIGNALING_HEARTBEAT_TIMEOUT:
+                del self.remote_nodes[node]
+                for client_id, (owner, _, _) in list(self.remote_clients.items()):
+                    if owner == node:
+                        room_id = self._forget_remote(client_id)
+                        self.broadcast_to_room(room_id, {"type": "user-left", "clientId": client_id})
+
+    async def _reap(self):
+        """Ping live connections and drop those that stopped answering"""
+        while True:
+            await asyncio.sleep(settings.SIGNALING_HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            self._publish({"kind": "alive"})
+            self._expire_nodes(now)
+            for connection in list(self.active_connections.values()):
+                if now - connection.last_seen > settings.SIGNALING_HEARTBEAT_TIMEOUT:
+                    self.stats["reaped"] += 1
+                    connection.drop("heartbeat timeout")
+                else:
+                    try:
+                        connection.send({"type": "ping"})
+                    except Exception as e:
+                        logger.error(f"Ping to {connection.client_id} failed: {e}")
+
+    def seen(self, client_id: str):
+        """Record that a client is alive (any inbound message counts)"""
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def join(self, client_id: str, websocket: WebSocket, room_id: str, user_id: int = None):
+        """Register a client's socket and add it to a room; user_id feeds presence"""
+        connection = self.active_connections.get(client_id)
+        if connection is None or connection.websocket is not websocket:
+            if connection is not None:
+                connection.close()
+            connection = ClientConnection(client_id, websocket, self._dropped)
+            self.active_connections[client_id] = connection
+        self._leave_room(client_id)
+        connection.user_id = user_id
+        self.rooms.setdefault(room_id, set()).add(client_id)
+        self.client_rooms[client_id] = room_id
+        self._room_changed(room_id)
+        if user_id is not None:
+            presence.set(f"signaling:{client_id}", user_id, room_id)
+        else:
+            presence.clear(f"signaling:{client_id}")
+        self._ensure_reaper()
+        self._publish_join(client_id, room_id)
+
+    def _publish_join(self, client_id: str, room_id: str):
+        connection = self.active_connections[client_id]
+        self._publish({"kind": "join", "client": client_id, "room": room_id, "user": connection.user_id})
+
+    def _leave_room(self, client_id: str):
+        room_id = self.client_rooms.pop(client_id, None)
+        members = self.rooms.get(room_id)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.rooms[room_id]
+            self._room_changed(room_id)
+        return room_id
+
+    def _room_changed(self, room_id: str):
+        """Report the signed-in members of a room, local and remote, to the lesson tracker"""
+        users: Dict[int, Set[str]] = {}
+        for client_id in self.rooms.get(room_id, ()):
+            connection = self.active_connections.get(client_id)
+            user_id = connection.user_id if connection else None
+            if user_id is not None:
+                users.setdefault(user_id, set()).add(self.node_id)
+        for client_id in self.remote_rooms.get(room_id, ()):
+            node, _, user_id = self.remote_clients[client_id]
+            if user_id is not None:
+                users.setdefault(user_id, set()).add(node)
+        tracker.room_changed(room_id, users, self.node_id)
+
+    def disconnect(self, client_id: str, websocket: WebSocket = None):
+        """
+        Remove a client and return the room it was in.
+        When websocket is given, only remove the client if that socket is
+        still the registered one (it may have re-registered on a new socket).
+        """
+        connection = self.active_connections.get(client_id)
+        if connection is None:
+            return None
+        if websocket is not None and connection.websocket is not websocket:
+            return None
+        connection.close()
+        del self.active_connections[client_id]
+        presence.clear(f"signaling:{client_id}")
+        logger.info(f"👋 Client disconnected: {client_id}")
+        room_id = self._leave_room(client_id)
+        if room_id:
+            self._publish({"kind": "leave", "client": client_id})
+        return room_id
+
+    async def _dropped(self, connection: ClientConnection):
+        """Clean up after a connection was dropped by its writer or the reaper"""
+        self.stats["dropped"] += 1
+        self.leave(connection.client_id, connection.websocket)
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=1013), settings.SIGNALING_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def room_of(self, client_id: str):
+        """Room of a local or remote client"""
+        if client_id in self.client_rooms:
+            return self.client_rooms[client_id]
+        entry = self.remote_clients.get(client_id)
+        return entry[1] if entry else None
+
+    def same_room(self, client_id: str, other_id: str) -> bool:
+        room_id = self.client_rooms.get(client_id)
+        return room_id is not None and room_id == self.room_of(other_id)
+
+    def relay(self, message: dict, target: str):
+        """Deliver to a local client, or route to the process holding it"""
+        if target in self.active_connections:
+            self.send_personal_message(message, target)
+        elif target in self.remote_clients:
+            node = self.remote_clients[target][0]
+            self._publish({"kind": "relay", "to": node, "target": target, "message": message})
+
+    def relay_frame(self, client_id: str, frame: bytes):
+        """
+        Relay a binary candidate batch. The body is checked once here; a local
+        binary peer then gets the original bytes without re-encoding
+        """
+        try:
+            kind, target, body = split_frame(frame)
+            if kind != ICE_BATCH:
+                raise FrameError(f"Unknown frame kind {kind}")
+            if not self.same_room(client_id, target):
+                logger.warning(f"Target {target} not found")
+                return
+            candidates = decode_body(body)
+            connection = self.active_connections.get(target)
+            if connection is not None:
+                connection.send_candidates(client_id, body if connection.binary else candidates)
+            else:
+                self.relay({"type": "ice-candidates", "from": client_id, "candidates": candidates}, target)
+        except FrameError as e:
+            logger.warning(f"Bad binary frame from {client_id}: {e}")
+
+    def send_personal_message(self, message: dict, client_id: str):
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            connection.send(message)
+
+    def broadcast_to_room(self, room_id: str, message: dict, exclude_client: str = None):
+        # Enqueue only; each connection's writer delivers concurrently
+        for client_id in list(self.rooms.get(room_id, ())):
             if client_id != exclude_client:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to {client_id}: {e}")
+                self.send_personal_message(message, client_id)
+
+    def get_room_members(self, room_id: str, exclude_client: str = None):
+        members = self.rooms.get(room_id, set()) | self.remote_rooms.get(room_id, set())
+        return [cid for cid in members if cid != exclude_client]
 
-    def get_other_clients(self, exclude_client: str = None):
-        return [cid for cid in self.active_connections.keys() if cid != exclude_client]
+    def leave(self, client_id: str, websocket: WebSocket):
+        """Remove a client whose socket closed and tell its room"""
+        room_id = self.disconnect(client_id, websocket)
+        if room_id:
+            self.broadcast_to_room(room_id, {
+                "type": "user-left",
+                "clientId": client_id
+            })
 
 
 manager = ConnectionManager()
@@ -65,35 +421,69 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.info("👤 New WebSocket connection")
 
         while True:
-            # Receive message
-            data = await websocket.receive_json()
+            # Receive message: JSON text, or a binary candidate batch
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            if client_id:
+                manager.seen(client_id)
+            if received.get("bytes") is not None:
+                if client_id:
+                    manager.relay_frame(client_id, received["bytes"])
+                continue
+            data = json.loads(received["text"])
             message_type = data.get("type")
 
-            if message_type == "register":
-                # Client registration
-                client_id = data.get("clientId")
-                manager.active_connections[client_id] = websocket
-                logger.info(f"✅ Client registered: {client_id}")
+            if message_type == "pong":
+                # Heartbeat reply; last_seen was refreshed above
+                continue
+
+            elif message_type == "register":
+                # Client registration into the lesson's room
+                new_id = data.get("clientId")
+                if not new_id or not isinstance(new_id, str):
+                    logger.warning("Register without a clientId")
+                    continue
+                if client_id and client_id != new_id:
+                    # Same socket under a new id: the old id must not keep a connection on it
+                    manager.leave(client_id, websocket)
+                client_id = new_id
+                room = data.get("room", data.get("lessonId"))
+                room_id = str(room) if room is not None else DEFAULT_ROOM
+                # An optional access token ties the peer to a user for presence
+                payload = decode_access_token(data["token"]) if data.get("token") else None
+                manager.join(client_id, websocket, room_id, payload.get("uid") if payload else None)
+                features = manager.active_connections[client_id].negotiate(data.get("features"))
+                logger.info(f"✅ Client registered: {client_id} (room {room_id})")
 
-                # Send list of other clients
-                other_clients = manager.get_other_clients(client_id)
-                await websocket.send_json({
+                # Send list of other clients in the room and the accepted features
+                manager.send_personal_message({
                     "type": "clients",
-                    "clients": other_clients
-                })
+                    "clients": manager.get_room_members(room_id, client_id),
+                    "features": features
+                }, client_id)
 
-                # Notify other clients about new user
-                await manager.broadcast({
+                # Notify the rest of the room about the new user
+                manager.broadcast_to_room(room_id, {
                     "type": "user-joined",
                     "clientId": client_id
                 }, exclude_client=client_id)
 
-            elif message_type in ["offer", "answer", "ice-candidate"]:
-                # Forward signaling messages
+            elif message_type in ["offer", "answer", "ice-candidate", "ice-candidates"]:
+                # Forward signaling messages within the room
                 target = data.get("target")
-                if target and target in manager.active_connections:
+                if target and manager.same_room(client_id, target):
+                    # Candidates are checked here so a bad one never reaches a batch
+                    try:
+                        if message_type == "ice-candidate":
+                            data["candidate"] = normalize_candidate(data.get("candidate"))
+                        elif message_type == "ice-candidates":
+                            data["candidates"] = normalize_candidates(data.get("candidates"))
+                    except FrameError as e:
+                        logger.warning(f"Bad ICE candidate from {client_id}: {e}")
+                        continue
                     data["from"] = client_id
-                    await manager.send_personal_message(data, target)
+                    manager.relay(data, target)
                 else:
                     logger.warning(f"Target {target} not found")
 
@@ -102,14 +492,19 @@ async def websocket_endpoint(websocket: WebSocket):
 
     except WebSocketDisconnect:
         logger.info(f"Client disconnected: {client_id}")
-        if client_id:
-            manager.disconnect(client_id)
-            # Notify others
-            await manager.broadcast({
-                "type": "user-left",
-                "clientId": client_id
-            })
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+    finally:
         if client_id:
-            manager.disconnect(client_id)
+            manager.leave(client_id, websocket)
+
+
+@router.get("/api/signaling/stats")
+def signaling_stats(current_user: models.User = Depends(get_current_admin_user)):
+    """Connection, room and reaping counters for the signaling server (Admin only)"""
+    return {
+        "connections": len(manager.active_connections),
+        "rooms": len(manager.rooms),
+        "remote_clients": len(manager.remote_clients),
+        **manager.stats,
+    }
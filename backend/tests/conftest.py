@@ -0,0 +1,54 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database, an admin account
+and a login helper
+"""
+import os
+import sys
+import tempfile
+
+_DATABASE = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DATABASE}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["LESSON_SWEEP_INTERVAL"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import models
+from auth import get_password_hash
+from database import Base, SessionLocal, engine
+
+
+@pytest.fixture()
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.add(models.User(
+        username="admin", email="admin@example.com",
+        hashed_password=get_password_hash("admin"), role=models.UserRole.ADMIN,
+    ))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture()
+def client(db):
+    return TestClient(main.app)
+
+
+@pytest.fixture()
+def login(client):
+    def login(username: str, password: str) -> dict:
+        response = client.post("/api/auth/login", data={"username": username, "password": password})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
+
+
+@pytest.fixture()
+def admin(login):
+    return login("admin", "admin")
@@ -0,0 +1,70 @@
+"""
+Lessons must not double-book a teacher or student
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+
+import pytest
+
+import availability
+import crud
+import models
+import schemas
+from database import SessionLocal
+
+
+@pytest.fixture()
+def pair(client, admin):
+    teacher_id = client.post(
+        "/api/teachers/", json={"name": "Amina", "username": "amina", "password": "pw"}, headers=admin
+    ).json()["id"]
+    student_id = client.post(
+        "/api/students/", json={"name": "Sara", "username": "sara", "password": "pw"}, headers=admin
+    ).json()["id"]
+    return teacher_id, student_id
+
+
+def _lesson(pair, start="2026-10-19T15:00:00", duration=30):
+    teacher_id, student_id = pair
+    return schemas.LessonCreate(
+        teacher_id=teacher_id, student_id=student_id, start_time=datetime.fromisoformat(start), duration=duration
+    )
+
+
+def test_overlapping_lesson_is_a_conflict(client, admin, pair):
+    body = _lesson(pair).model_dump(mode="json")
+    assert client.post("/api/lessons/", json=body, headers=admin).status_code == 201
+    response = client.post("/api/lessons/", json={**body, "start_time": "2026-10-19T15:15:00"}, headers=admin)
+    assert response.status_code == 409
+    assert len(response.json()["detail"]["conflicts"]) == 1
+    assert client.post("/api/lessons/", json={**body, "start_time": "2026-10-19T15:30:00"}, headers=admin).status_code == 201
+
+
+def test_crud_functions_refuse_double_booking(db, pair):
+    teacher_id, student_id = pair
+    crud.start_lesson(db, student_id=student_id, teacher_id=teacher_id)
+    with pytest.raises(availability.LessonConflictError):
+        crud.start_lesson(db, student_id=student_id, teacher_id=teacher_id)
+    with pytest.raises(availability.LessonConflictError):
+        crud.create_lesson(db, _lesson(pair, start=datetime.utcnow().isoformat()))
+
+
+def test_concurrent_bookings_insert_one_lesson(db, pair):
+    barrier = threading.Barrier(4)
+
+    def book(_):
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            crud.create_lesson(session, _lesson(pair))
+            return True
+        except availability.LessonConflictError:
+            return False
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(book, range(4)))
+    assert results.count(True) == 1
+    assert db.query(models.Lesson).count() == 1
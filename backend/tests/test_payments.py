@@ -0,0 +1,44 @@
+"""
+One payment per student and month
+"""
+
+
+def _student(client, admin, name):
+    response = client.post(
+        "/api/students/", json={"name": name, "username": name.lower(), "password": "pw"}, headers=admin
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _payment(client, admin, student_id, month):
+    return client.post(
+        "/api/payments/", json={"student_id": student_id, "month": month, "amount": 50}, headers=admin
+    )
+
+
+def test_duplicate_payment_is_a_conflict(client, admin):
+    student_id = _student(client, admin, "Sara")
+    assert _payment(client, admin, student_id, "2026-01").status_code == 201
+    assert _payment(client, admin, student_id, "2026-01").status_code == 409
+
+
+def test_moving_a_payment_onto_an_existing_month_is_a_conflict(client, admin):
+    student_id = _student(client, admin, "Sara")
+    assert _payment(client, admin, student_id, "2026-01").status_code == 201
+    february = _payment(client, admin, student_id, "2026-02").json()["id"]
+
+    response = client.put(f"/api/payments/{february}", json={"month": "2026-01"}, headers=admin)
+    assert response.status_code == 409
+
+    # The rejected change left the payment as it was
+    assert client.get(f"/api/payments/{february}", headers=admin).json()["month"] == "2026-02"
+
+
+def test_moving_a_payment_to_another_student(client, admin):
+    first, second = _student(client, admin, "Sara"), _student(client, admin, "Omar")
+    payment_id = _payment(client, admin, first, "2026-01").json()["id"]
+    assert _payment(client, admin, second, "2026-01").status_code == 201
+
+    assert client.put(f"/api/payments/{payment_id}", json={"student_id": second}, headers=admin).status_code == 409
+    assert client.put(f"/api/payments/{payment_id}", json={"student_id": 999}, headers=admin).status_code == 404
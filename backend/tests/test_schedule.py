@@ -0,0 +1,34 @@
+"""
+Schedule slots when their teacher goes away
+"""
+import models
+
+
+def test_deleting_a_teacher_unassigns_their_schedule_slots(client, admin, db):
+    teacher_id = client.post(
+        "/api/teachers/", json={"name": "Amina", "username": "amina", "password": "pw"}, headers=admin
+    ).json()["id"]
+    student_id = client.post("/api/students/", json={
+        "name": "Sara", "username": "sara", "password": "pw",
+        "schedule": "Mon-Wed 3:00 PM", "assigned_teacher_id": teacher_id,
+    }, headers=admin).json()["id"]
+    week = "start_date=2026-10-19&end_date=2026-10-25"
+    assert [row["teacher_id"] for row in client.get(f"/api/schedule/calendar?{week}", headers=admin).json()] == [
+        teacher_id, teacher_id
+    ]
+
+    conflicts = lambda: client.get(
+        "/api/schedule/conflicts",
+        params={"start": "2026-10-19T15:00:00Z", "end": "2026-10-19T16:00:00Z", "teacher_id": teacher_id},
+        headers=admin,
+    ).json()
+    assert len(conflicts()) == 1
+
+    assert client.delete(f"/api/teachers/{teacher_id}", headers=admin).status_code == 204
+
+    slots = db.query(models.ScheduleSlot).filter(models.ScheduleSlot.student_id == student_id).all()
+    assert len(slots) == 2 and all(slot.teacher_id is None for slot in slots)
+    assert client.get(f"/api/students/{student_id}", headers=admin).json()["assigned_teacher_id"] is None
+    calendar = client.get(f"/api/schedule/calendar?{week}", headers=admin).json()
+    assert [(row["teacher_id"], row["teacher_name"]) for row in calendar] == [(None, None), (None, None)]
+    assert conflicts() == []
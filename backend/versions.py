@@ -0,0 +1,139 @@
+"""
+Table version stamps and conditional GET (ETag / If-None-Match) helpers
+
+Every committed ORM write bumps an in-process counter for the tables it
+touched. Polled endpoints derive their ETag from those counters instead of
+re-running their queries, so an unchanged poll can be answered with 304.
+Counters live in process memory; the app runs as a single uvicorn worker.
+
+Tables registered with track_period() are also versioned per period
+("payments@2024-01") or other partition of their rows ("lessons@teacher:5"),
+so results for one closed month or one teacher survive writes elsewhere.
+"""
+import hashlib
+import os
+from collections import defaultdict
+from datetime import date
+from typing import Callable, Dict, Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Distinguishes counters across restarts so old ETags never match
+_BOOT_TOKEN = os.urandom(4).hex()
+
+_versions: Dict[str, int] = defaultdict(int)
+
+# {mapped class: [(attribute, function mapping its value to period names)]}
+_period_attrs: Dict[type, list] = {}
+
+# Period name that stands for "any period" (bulk writes with unknown rows)
+ANY_PERIOD = "*"
+
+
+def bump(*tables: str) -> None:
+    """Mark tables as changed"""
+    for table in tables:
+        _versions[table] += 1
+
+
+def touch(session: Session, *keys: str) -> None:
+    """Bump keys when this session's transaction commits (changes the flush tracking cannot see)"""
+    session.info.setdefault("touched_tables", set()).update(keys)
+
+
+def current(*tables: str) -> tuple:
+    """Current version stamp for a set of tables"""
+    return tuple(_versions[table] for table in tables)
+
+
+def period_key(table: str, period: str) -> str:
+    return f"{table}@{period}"
+
+
+def period_stamp(table: str, period: str) -> tuple:
+    """Version stamp for one period of a table (includes bulk writes to any period)"""
+    return current(period_key(table, period), period_key(table, ANY_PERIOD))
+
+
+def track_period(model, attribute: str, periods: Callable[[object], Iterable[str]] = lambda value: (value,)):
+    """Also version rows of model per period, derived from one attribute's old and new values"""
+    _period_attrs.setdefault(model, []).append((attribute, periods))
+
+
+def _tables_of(instances: Iterable) -> set:
+    return {instance.__table__.name for instance in instances if hasattr(instance, "__table__")}
+
+
+def periods_of(instances: Iterable) -> set:
+    """Period keys ("table@period") touched by pending writes to these instances"""
+    touched = set()
+    for instance in instances:
+        for attribute, periods in _period_attrs.get(type(instance), ()):
+            history = inspect(instance).attrs[attribute].history
+            for value in (*history.added, *history.deleted, *history.unchanged):
+                if value is not None:
+                    touched.update(period_key(instance.__table__.name, period) for period in periods(value))
+    return touched
+
+
+def bulk_periods(context) -> set:
+    """
+    Period keys touched by a bulk query.update()/delete(). Callers that know
+    the affected periods pass them with query.execution_options(periods=...);
+    otherwise every period of the table counts as touched.
+    """
+    if context.mapper.class_ not in _period_attrs:
+        return set()
+    table = context.mapper.local_table.name
+    periods = context.query.get_execution_options().get("periods", (ANY_PERIOD,))
+    return {period_key(table, period) for period in periods}
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    """Remember which tables this transaction wrote"""
+    instances = (*session.new, *session.dirty, *session.deleted)
+    touched = _tables_of(instances) | periods_of(instances)
+    session.info.setdefault("touched_tables", set()).update(touched)
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _track_bulk(context):
+    """Bulk query.update()/delete() bypass the flush; track them when rows changed"""
+    if context.result.rowcount:
+        table = context.mapper.local_table.name
+        touched = context.session.info.setdefault("touched_tables", set())
+        touched.add(table)
+        touched.update(bulk_periods(context))
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    bump(*session.info.pop("touched_tables", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("touched_tables", None)
+
+
+def etag_for(request: Request, *tables: str, scope: Optional[object] = None, daily: bool = False) -> str:
+    """
+    Build an ETag from the table versions, request URL and caller scope.
+    daily=True also keys on today's date for payloads with "today" figures.
+    """
+    parts = [_BOOT_TOKEN, request.url.path, request.url.query, str(scope), *map(str, current(*tables))]
+    if daily:
+        parts.append(date.today().isoformat())
+    digest = hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response when the client already holds this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -3,7 +3,7 @@
 import { useState, useEffect, useRef } from 'react';
 import Navbar from '@/components/Navbar';
 import Loading from '@/components/Loading';
-import { messagesAPI, dashboardAPI, studentsAPI, teachersAPI } from '@/lib/api';
+import { messagesAPI, dashboardAPI, studentsAPI, teachersAPI, presenceAPI } from '@/lib/api';
 import {
   FiMessageCircle,
   FiSend,
@@ -43,7 +43,9 @@ export default function ChatPage() {
   const [userRole, setUserRole] = useState<string>('');
   const [availableUsers, setAvailableUsers] = useState<any[]>([]);
   const [showNewChatModal, setShowNewChatModal] = useState(false);
+  const [onlineUsers, setOnlineUsers] = useState<Record<number, boolean>>({});
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const presenceSocketRef = useRef<WebSocket | null>(null);
 
   useEffect(() => {
     const role = localStorage.getItem('userRole') || '';
@@ -55,6 +57,26 @@ export default function ChatPage() {
     return () => clearInterval(interval);
   }, []);
 
+  useEffect(() => {
+    // Presence pushes replace polling for "who is online"
+    const ws = presenceAPI.subscribe((statuses) => {
+      setOnlineUsers(prev => {
+        const next = { ...prev };
+        statuses.forEach(status => { next[status.user_id] = status.online; });
+        return next;
+      });
+    });
+    presenceSocketRef.current = ws;
+    return () => ws.close();
+  }, []);
+
+  const conversationUserIds = conversations.map(c => c.user_id).join(',');
+  useEffect(() => {
+    if (presenceSocketRef.current && conversationUserIds) {
+      presenceAPI.watch(presenceSocketRef.current, conversationUserIds.split(',').map(Number));
+    }
+  }, [conversationUserIds]);
+
   useEffect(() => {
     if (selectedConversation) {
       fetchMessages(selectedConversation.user_id);
@@ -242,6 +264,9 @@ export default function ChatPage() {
                       <span className="font-semibold text-gray-800">
                         {conversation.user_name}
                       </span>
+                      {onlineUsers[conversation.user_id] && (
+                        <span className="w-2 h-2 rounded-full bg-green-500" title="Online" />
+                      )}
                     </div>
                     {conversation.unread_count > 0 && (
                       <span className="bg-red-500 text-white text-xs rounded-full px-2 py-0.5">
@@ -55,6 +55,10 @@ export default function VideoClass({
   const dataChannelRef = useRef<RTCDataChannel | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const localStreamRef = useRef<MediaStream | null>(null);
+  // Candidate batching is used only when the signaling server accepts it at register
+  const batchCandidatesRef = useRef(false);
+  const pendingCandidatesRef = useRef<RTCIceCandidateInit[]>([]);
+  const candidateTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
 
   const iceServers = {
     iceServers: [
@@ -130,7 +134,13 @@ export default function VideoClass({
 
     ws.onopen = () => {
       console.log('Connected to signaling server');
-      ws.send(JSON.stringify({ type: 'register', clientId }));
+      ws.send(JSON.stringify({
+        type: 'register',
+        clientId,
+        room: lessonId,
+        features: ['batch'],
+        token: localStorage.getItem('token') || undefined
+      }));
       setConnectionStatus('connected');
     };
 
@@ -139,8 +149,13 @@ export default function VideoClass({
       console.log('Received message:', data.type);
 
       switch (data.type) {
+        case 'ping':
+          ws.send(JSON.stringify({ type: 'pong' }));
+          break;
+
         case 'clients':
           console.log('Available clients:', data.clients);
+          batchCandidatesRef.current = (data.features || []).includes('batch');
           if (data.clients.length > 0 && !peerConnectionRef.current) {
             const targetClient = data.clients[0];
             if (clientId < targetClient) {
@@ -169,6 +184,12 @@ export default function VideoClass({
           await handleIceCandidate(data);
           break;
 
+        case 'ice-candidates':
+          for (const candidate of data.candidates) {
+            await handleIceCandidate({ candidate });
+          }
+          break;
+
         case 'user-left':
           handleUserLeft();
           break;
@@ -235,12 +256,28 @@ export default function VideoClass({
     };
 
     pc.onicecandidate = (event) => {
-      if (event.candidate && wsRef.current) {
+      if (!event.candidate || !wsRef.current) return;
+      if (!batchCandidatesRef.current) {
         wsRef.current.send(JSON.stringify({
           type: 'ice-candidate',
           candidate: event.candidate,
           target: targetClientId
         }));
+        return;
+      }
+      // Coalesce candidates gathered within a short window into one message
+      pendingCandidatesRef.current.push(event.candidate.toJSON());
+      if (!candidateTimerRef.current) {
+        candidateTimerRef.current = setTimeout(() => {
+          candidateTimerRef.current = null;
+          const candidates = pendingCandidatesRef.current;
+          pendingCandidatesRef.current = [];
+          wsRef.current?.send(JSON.stringify({
+            type: 'ice-candidates',
+            candidates,
+            target: targetClientId
+          }));
+        }, 20);
       }
     };
 
@@ -483,6 +520,9 @@ export default function VideoClass({
     if (peerConnectionRef.current) {
       peerConnectionRef.current.close();
     }
+    if (candidateTimerRef.current) {
+      clearTimeout(candidateTimerRef.current);
+    }
     if (wsRef.current) {
       wsRef.current.close();
     }
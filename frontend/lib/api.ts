@@ -186,6 +186,16 @@ export const paymentsAPI = {
     const response = await api.delete(`/api/payments/${id}`);
     return response.data;
   },
+  bulkUpdate: async (data: {
+    payment_ids?: number[];
+    month?: string;
+    student_ids?: number[];
+    status?: 'paid' | 'unpaid';
+    paid_date?: string;
+  }) => {
+    const response = await api.post('/api/payments/bulk-update', data);
+    return response.data;
+  },
   markPaid: async (id: number) => {
     const response = await api.post(`/api/payments/${id}/mark-paid`);
     return response.data;
@@ -206,6 +216,14 @@ export const dashboardAPI = {
     const response = await api.get('/api/dashboard/student-history');
     return response.data;
   },
+  getPayroll: async (month?: string) => {
+    const response = await api.get('/api/dashboard/payroll', { params: { month } });
+    return response.data;
+  },
+  getRevenue: async (params?: { start_month?: string; end_month?: string; by_teacher?: boolean }) => {
+    const response = await api.get('/api/dashboard/revenue', { params });
+    return response.data;
+  },
   getTeacherDashboard: async () => {
     const response = await api.get('/api/dashboard/teacher/me');
     return response.data;
@@ -216,6 +234,48 @@ export const dashboardAPI = {
   },
 };
 
+// ============= Schedule API =============
+export const scheduleAPI = {
+  getCalendar: async (params?: {
+    start_date?: string;
+    end_date?: string;
+    teacher_id?: number;
+    student_id?: number;
+    from_time?: string;
+    to_time?: string;
+  }) => {
+    const response = await api.get('/api/schedule/calendar', { params });
+    return response.data;
+  },
+  getFreeSlots: async (params: {
+    teacher_id: number;
+    week_start?: string;
+    duration?: number;
+    day_start?: string;
+    day_end?: string;
+    student_id?: number;
+  }) => {
+    const response = await api.get('/api/schedule/free-slots', { params });
+    return response.data;
+  },
+  getConflicts: async (params: { start: string; end: string; teacher_id?: number; student_id?: number }) => {
+    const response = await api.get('/api/schedule/conflicts', { params });
+    return response.data;
+  },
+};
+
+// ============= Calendar Feed API =============
+export const calendarAPI = {
+  getFeed: async () => {
+    const response = await api.get('/api/calendar/feed');
+    return response.data;
+  },
+  rotateFeed: async () => {
+    const response = await api.post('/api/calendar/feed/rotate');
+    return response.data;
+  },
+};
+
 // ============= Achievements API =============
 export const achievementsAPI = {
   getAll: async (params?: any) => {
@@ -269,3 +329,43 @@ export const messagesAPI = {
     return response.data;
   },
 };
+
+// ============= Presence API =============
+export interface PresenceStatus {
+  user_id: number;
+  online: boolean;
+  lesson_id: number | null;
+  room: string | null;
+  since: string | null;
+}
+
+export const presenceAPI = {
+  get: async (userIds: number[]): Promise<PresenceStatus[]> => {
+    const response = await api.get('/api/presence', { params: { user_ids: userIds.join(',') } });
+    return response.data;
+  },
+  // Opens a push subscription; the open socket also marks the current user online
+  subscribe: (onUpdate: (statuses: PresenceStatus[]) => void): WebSocket => {
+    const token = localStorage.getItem('token') || '';
+    const wsUrl = API_URL.replace('http://', 'ws://').replace('https://', 'wss://');
+    const ws = new WebSocket(`${wsUrl}/ws/presence?token=${encodeURIComponent(token)}`);
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'snapshot') {
+        onUpdate(data.users);
+      } else if (data.type === 'presence') {
+        const { type, ...status } = data;
+        onUpdate([status]);
+      }
+    };
+    return ws;
+  },
+  watch: (ws: WebSocket, userIds: number[]) => {
+    const send = () => ws.send(JSON.stringify({ type: 'watch', user_ids: userIds }));
+    if (ws.readyState === WebSocket.OPEN) {
+      send();
+    } else {
+      ws.addEventListener('open', send, { once: true });
+    }
+  },
+};
@@ -1,10 +1,11 @@
 const WebSocket = require('ws');
 
-const wss = new WebSocket.Server({ port: 8080 });
+const PORT = Number(process.env.PORT) || 8080;
+const wss = new WebSocket.Server({ port: PORT });
 
 const clients = new Map();
 
-console.log('🚀 Signaling server started on ws://localhost:8080');
+console.log(`🚀 Signaling server started on ws://localhost:${PORT}`);
 
 wss.on('connection', (ws) => {
   let clientId = null;